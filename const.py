@@ -1,35 +1,146 @@
+import asyncio
 import os
+from functools import cached_property, lru_cache
+from typing import Optional, Tuple
 
 from dotenv import load_dotenv
 from github import GithubIntegration
-from github.Repository import Repository
+from fastapi.responses import JSONResponse
 from loguru import logger
 
+from core.cache import cache_registry
 from core.credit import CreditFetcher
-from core.mongo import IssueOperation, global_client
-from core.utils import get_repo_setting
+from core.openai import OpenAICredential
+from core.github_app import (
+    CachedAppAuth,
+    IssueWriteBuffer,
+    RepoClient,
+    create_http_cache_backend,
+    get_token_cache,
+    github_executor,
+    github_rest_client,
+    install_http_cache,
+    set_default_backend,
+)
+from core.mongo import IssueOperation, MongoSharedCache, claim_delivery, release_delivery
+from core.operation_store import get_operation, get_operation_store, operation_writer
+from core.utils import (
+    SETTING_CACHE_LOCAL_TTL,
+    SETTING_CACHE_PUSH_TTL,
+    SETTING_CACHE_TTL,
+    Card,
+    RepoSetting,
+    get_repo_setting,
+    setting_cache,
+)
+from core.webhook.context import EventContext
+from core.webhook.dedup import DeliveryDeduplicator
 from core.webhook.handler import GithubWebhookHandler
 from settings.server import ServerSetting
 
 load_dotenv()
 
-webhook_handler = GithubWebhookHandler()
+webhook_handler = GithubWebhookHandler(
+    background=ServerSetting.webhook_background,
+    workers=ServerSetting.webhook_workers,
+    max_queue_size=ServerSetting.webhook_queue_size,
+    # Without MongoDB, deliveries are only deduplicated in memory
+    deduplicator=DeliveryDeduplicator(
+        backend=claim_delivery if get_operation_store().name == "mongo" else None,
+        release_backend=release_delivery if get_operation_store().name == "mongo" else None,
+    ),
+)
 webhook_handler.debug = bool(os.getenv("DEBUG"))
 if webhook_handler.debug:
     print("Debug mode enabled")
 
-git_integration = GithubIntegration(
-    integration_id=ServerSetting.github_app_id,
-    private_key=ServerSetting.github_private_key.get_secret_value(),
-    user_agent="pygithub/Python",
-)
+set_default_backend(ServerSetting.github_backend)
+if ServerSetting.shared_cache and get_operation_store().name == "mongo":
+    setting_cache.l2 = MongoSharedCache()
+    # Only push events reach every worker's view through the L2, without them a change waits for expiry
+    setting_cache.l2_ttl = SETTING_CACHE_PUSH_TTL if ServerSetting.setting_push_invalidation else SETTING_CACHE_TTL
+    setting_cache.ttl = setting_cache.negative_ttl = SETTING_CACHE_LOCAL_TTL
+cache_registry.register("delivery_dedup", webhook_handler.deduplicator.stats)
+cache_registry.register("github_etag", github_rest_client.etag_cache_stats)
+
+
+@lru_cache(maxsize=None)
+def get_git_integration() -> GithubIntegration:
+    """Build the GitHub App integration on first use, the private key is read then."""
+    return GithubIntegration(
+        auth=CachedAppAuth(
+            app_id=ServerSetting.github_app_id,
+            private_key=ServerSetting.load_private_key(),
+        ),
+        user_agent="pygithub/Python",
+    )
+
+
+# Registered at import so the cache is listed before the first event needs a token
+cache_registry.register("installation_tokens", lambda: get_token_cache(get_git_integration()).stats())
+
+
+def install_github_http_cache() -> bool:
+    """
+    Install the conditional HTTP cache of PyGithub calls, only the pygithub backend uses it.
+    :return: Whether the cache is installed
+    """
+    if ServerSetting.github_http_cache == "off":
+        return False
+    backend = create_http_cache_backend(
+        ServerSetting.github_http_cache,
+        path=ServerSetting.github_http_cache_path,
+        max_bytes=ServerSetting.github_http_cache_size,
+    )
+    http_cache = install_http_cache(
+        backend, resolve_scope=lambda token: get_token_cache(get_git_integration()).installation_of(token)
+    )
+    cache_registry.register("github_http", http_cache.stats)
+    logger.info(f"PyGithub HTTP cache installed --backend {backend.name}")
+    return True
+
+
+@webhook_handler.app.get("/status/github")
+async def github_status():
+    """Report JWT signing cost, installation token cache and GitHub client counters."""
+    git_integration = get_git_integration()
+    return {
+        "backend": ServerSetting.github_backend,
+        "jwt": git_integration.auth.stats(),
+        "installation_tokens": get_token_cache(git_integration).stats(),
+        "executor": github_executor.stats(),
+        "rest": github_rest_client.stats(),
+    }
+
+
+@webhook_handler.app.get("/status/caches")
+async def caches_status():
+    """Report size, hit ratio, load latency and evictions by reason of every registered cache."""
+    return cache_registry.snapshot()
+
+
+@webhook_handler.app.get("/status/ready")
+async def readiness():
+    """Readiness probe, 503 until the operation store answers a ping."""
+    store = get_operation_store()
+    try:
+        latency = await asyncio.wait_for(store.ping(), timeout=2)
+    except Exception as e:
+        return JSONResponse(status_code=503, content={"ready": False, store.name: {"error": str(e)}})
+    return {"ready": True, store.name: {"latency_ms": round(latency * 1000, 3)}}
 
 
-async def get_credentials(repo_name, repo: Repository):
+@webhook_handler.app.get("/status/operations")
+async def operations_status():
+    """Report the operation store and its write-behind buffer."""
+    return {"store": get_operation_store().name, "write_behind": operation_writer.stats()}
+
+
+async def get_credentials(repo_name, client: RepoClient):
     return await CreditFetcher.get(
-        repo_setting=get_repo_setting(
+        repo_setting=await get_repo_setting(
             repo_name=repo_name,
-            repo=repo
+            client=client
         ),
         dash_api=ServerSetting.dashboard_api_url,
         token_secret=ServerSetting.token_secret
@@ -40,18 +151,64 @@ async def fetch_operation(
         issue_id: int, repo_name: str
 ):
     try:
-        saved_issue = await global_client.find_one(
-            IssueOperation,
-            IssueOperation.issue_id == issue_id,  # noqa
-            IssueOperation.repo_name == repo_name  # noqa
-        )
-        if not saved_issue:
-            saved_issue = IssueOperation(
-                issue_id=issue_id,
-                repo_name=repo_name,
-            )
-            await global_client.save(saved_issue)
-        return saved_issue
+        return await get_operation(repo_name=repo_name, issue_id=issue_id)
     except Exception as e:
         logger.error(f"Failed to save issue operation: {e}")
         return None
+
+
+class RepoContext(EventContext):
+    """
+    Per-delivery context of repository events.
+    Handlers of the same delivery share one client, and the repository setting, credentials,
+    issue operation and issue lookups are fetched once.
+    Issue edits queued on `writes` are sent after the handlers finish, at most one edit and one
+    label request per issue.
+    """
+
+    @cached_property
+    def client(self) -> RepoClient:
+        return self.model.repo_client(get_git_integration())
+
+    @cached_property
+    def writes(self) -> IssueWriteBuffer:
+        return IssueWriteBuffer(self.client, deadline=ServerSetting.issue_write_deadline)
+
+    @property
+    def repo_name(self) -> str:
+        return self.model.repository.full_name
+
+    async def repo_setting(self) -> RepoSetting:
+        return await self.memo(
+            "repo_setting",
+            lambda: get_repo_setting(repo_name=self.repo_name, client=self.client)
+        )
+
+    async def enabled(self, feature_flag: str) -> bool:
+        return bool(getattr(await self.repo_setting(), feature_flag, False))
+
+    async def credentials(self) -> Tuple[Card, OpenAICredential]:
+        async def load():
+            return await CreditFetcher.get(
+                repo_setting=await self.repo_setting(),
+                dash_api=ServerSetting.dashboard_api_url,
+                token_secret=ServerSetting.token_secret
+            )
+
+        return await self.memo("credentials", load)
+
+    async def operation(self) -> Optional[IssueOperation]:
+        return await self.memo(
+            "operation",
+            lambda: fetch_operation(issue_id=self.model.issue.id, repo_name=self.repo_name)
+        )
+
+    async def issue(self) -> dict:
+        return await self.memo("issue", lambda: self.client.get_issue(self.model.issue.number))
+
+    async def close(self):
+        if "writes" in self.__dict__:
+            await self.writes.close()
+
+
+webhook_handler.context_factory = RepoContext
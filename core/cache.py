@@ -1,82 +1,518 @@
+import asyncio
+import random
+import sys
 import time
+from abc import ABC, abstractmethod
 from collections import OrderedDict
-from threading import RLock
+from dataclasses import dataclass
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, NamedTuple, Optional, Tuple
 
+from loguru import logger
+from pydantic import BaseModel
 
-class ExpiringDict:
-    def __init__(self, max_len=100, max_age_seconds=60):
+
+class CacheRegistry:
+    """
+    Central view of every cache of the app, for tuning sizes and TTLs from production data.
+    A source is any callable returning a stats dict. Common keys are `size`, `hits`, `misses`,
+    `loads`, `load_ms_avg` and `evictions` by reason (ttl, size, invalidation).
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], dict]] = {}
+
+    def register(self, name: str, stats: Callable[[], dict]):
+        """
+        :param name: Unique cache name, a later registration with the same name replaces it
+        :param stats: Returns the current statistics of the cache
+        """
+        self._sources[name] = stats
+
+    def unregister(self, name: str):
+        self._sources.pop(name, None)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Statistics of every registered cache, with a `hit_ratio` where hits and misses are known."""
+        snapshot = {}
+        for name, source in list(self._sources.items()):
+            try:
+                stats = dict(source())
+            except Exception as exc:
+                stats = {"error": str(exc)}
+            hits, misses = stats.get("hits"), stats.get("misses")
+            if isinstance(hits, int) and isinstance(misses, int):
+                stats["hit_ratio"] = round(hits / (hits + misses), 4) if hits + misses else None
+            snapshot[name] = stats
+        return snapshot
+
+    def log_summary(self):
+        for name, stats in self.snapshot().items():
+            evictions = stats.get("evictions")
+            if isinstance(evictions, dict):
+                evictions = " ".join(f"{reason}={count}" for reason, count in evictions.items())
+            logger.info(
+                f"Cache {name} --size {stats.get('size')} --hit_ratio {stats.get('hit_ratio')} "
+                f"--loads {stats.get('loads')} --load_ms_avg {stats.get('load_ms_avg')} --evictions {evictions}"
+            )
+
+    async def report_periodically(self, interval: float):
+        """Log a summary every `interval` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            self.log_summary()
+
+
+cache_registry = CacheRegistry()
+
+
+def estimate_size(value: Any) -> int:
+    """Rough memory footprint of a cached value in bytes."""
+    if isinstance(value, BaseModel):
+        return len(value.model_dump_json())
+    if isinstance(value, (str, bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+_MASK64 = (1 << 64) - 1
+
+
+class FrequencySketch:
+    """
+    Count-min sketch of access frequencies with periodic aging, the TinyLFU admission filter.
+
+    Counters saturate at 15 and are halved once `sample_size` accesses have been recorded,
+    so the sketch follows recent popularity. Every operation is O(1) amortized.
+    """
+
+    MAX_COUNT = 15
+    SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93)
+    """Odd multipliers of the rows, one independent multiplicative hash per row"""
+    DEPTH = len(SEEDS)
+
+    def __init__(self, width: int = 1024, sample_size: Optional[int] = None):
+        """
+        :param width: Counters per row, rounded up to a power of two, about 10x the expected entries
+        :param sample_size: Accesses between two agings, defaults to 10x the width
+        """
+        self.width = 1 << max(width - 1, 1).bit_length()
+        self.sample_size = sample_size or self.width * 10
+        self.additions = 0
+        self._shift = 64 - (self.width.bit_length() - 1)
+        self._table = bytearray(self.width * self.DEPTH)
+
+    def _indexes(self, key: Hashable):
+        # The top bits of a multiplicative hash, so rows do not collide for the same keys
+        key_hash = hash(key) & _MASK64
+        for row, seed in enumerate(self.SEEDS):
+            yield row * self.width + (((key_hash * seed) & _MASK64) >> self._shift)
+
+    def increment(self, key: Hashable):
+        for index in self._indexes(key):
+            if self._table[index] < self.MAX_COUNT:
+                self._table[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def frequency(self, key: Hashable) -> int:
+        return min(self._table[index] for index in self._indexes(key))
+
+    def _age(self):
+        self._table = bytearray(count >> 1 for count in self._table)
+        self.additions //= 2
+
+
+class SharedEntry(NamedTuple):
+    value: Any
+    """Encoded value, None for a cached negative result"""
+    version: int
+    live: bool = True
+    """False once the entry expired or was invalidated, its version is still current"""
+
+
+class SharedCacheBackend(ABC):
+    """
+    L2 cache shared by every worker process and node, behind the in-process `AsyncCache`.
+    Each key carries a version that is bumped on every write and invalidation, writes are
+    compare-and-set against the version the writer saw, so a value loaded before an
+    invalidation or a newer write never replaces it.
+    """
+
+    @abstractmethod
+    async def get(self, namespace: str, key: str) -> Optional[SharedEntry]:
+        """
+        :return: The entry, not `live` if it expired or was invalidated, None if the key is unknown
+        """
+
+    @abstractmethod
+    async def set(self, namespace: str, key: str, value: Any, ttl: float, expected_version: int) -> Optional[int]:
+        """
+        Store an encoded value for `ttl` seconds if the key is still at `expected_version`.
+        :param expected_version: Version returned by `get`, 0 for an unknown key
+        :return: The new version of the key, None if the version has moved and nothing was written
+        """
+
+    @abstractmethod
+    async def invalidate(self, namespace: str, key: str) -> int:
+        """
+        Drop the value of a key for every worker.
+        :return: The new version of the key
+        """
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    """Served as fresh until then"""
+    stale_until: float
+    """Served while revalidating until then"""
+    negative: bool = False
+    size: int = 0
+    version: Optional[int] = None
+    """Version of the shared entry the value came from or was written as"""
+
+
+class AsyncCache:
+    """
+    asyncio-native TTL cache with request coalescing and stale-while-revalidate.
+
+    - One loader runs per key, concurrent callers of a missing key await the same load.
+    - After `ttl`, an entry is served stale for up to `stale_ttl` more seconds while a single
+      background load refreshes it. A failed refresh keeps serving the stale value.
+    - Negative results (None by default) are cached for `negative_ttl`, so missing data is
+      not fetched again on every call.
+    - TTLs are jittered so entries loaded together do not expire together.
+    - Errors are never cached.
+
+    Entries are bounded by count and, with `max_bytes`, by estimated size. Eviction is LRU and
+    expiry is checked on access, every operation is O(1) amortized. With an `admission` sketch,
+    a new key only displaces the LRU victims it needs if it was accessed more often than each
+    of them (TinyLFU), so a scan of one-off keys cannot flush the hot ones.
+
+    With an `l2` backend, a miss first looks for a value another worker already loaded, and
+    loaded values are shared with `l2_ttl`. Values cross the L2 through `encode` and `decode`.
+    If the shared version moved during a load, the key was invalidated or written by another
+    worker, so the loaded value is returned to its callers but neither shared nor cached.
+    """
+
+    def __init__(
+            self,
+            ttl: float,
+            stale_ttl: float = 0,
+            negative_ttl: Optional[float] = None,
+            jitter: float = 0.1,
+            max_len: int = 1024,
+            is_negative: Callable[[Any], bool] = lambda value: value is None,
+            max_bytes: Optional[int] = None,
+            admission: Optional[FrequencySketch] = None,
+            sizeof: Callable[[Any], int] = estimate_size,
+            namespace: Optional[str] = None,
+            l2: Optional[SharedCacheBackend] = None,
+            l2_ttl: Optional[float] = None,
+            encode: Callable[[Any], Any] = lambda value: value,
+            decode: Callable[[Any], Any] = lambda value: value,
+            name: Optional[str] = None,
+    ):
+        """
+        :param ttl: Seconds an entry is fresh
+        :param stale_ttl: Seconds an expired entry may still be served while it is refreshed
+        :param negative_ttl: Seconds a negative result is cached, defaults to `ttl`
+        :param jitter: Relative random spread applied to every TTL, 0.1 is +-10%
+        :param max_len: Maximum number of entries, least recently used are evicted
+        :param is_negative: Whether a loaded value is a negative result
+        :param max_bytes: Maximum estimated size of all values, None for no limit
+        :param admission: Frequency sketch deciding whether a new key may evict an old one
+        :param sizeof: Estimates the size of a value in bytes
+        :param namespace: Name of the cache in the L2
+        :param l2: Shared backend, None to keep the cache in process
+        :param l2_ttl: Seconds a value lives in the L2, defaults to `ttl`
+        :param encode: Turns a value into something the L2 can store
+        :param decode: Inverse of `encode`
+        :param name: Name in the `cache_registry`, None to leave the cache unregistered
+        """
+        if l2 is not None and not namespace:
+            raise ValueError("A namespace is required to share the cache")
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.jitter = jitter
         self.max_len = max_len
-        self.max_age_seconds = max_age_seconds
-        self.data = OrderedDict()
-        self.lock = RLock()
-
-    def _expire(self):
-        # This method removes expired items
-        current_time = time.time()
-        keys_to_delete = []
-        for key, (value, timestamp) in self.data.items():
-            if current_time - timestamp > self.max_age_seconds:
-                keys_to_delete.append(key)
-            else:
-                break  # Remaining items are still valid
-
-        for key in keys_to_delete:
-            del self.data[key]
-
-    def set(self, key, value):
-        with self.lock:
-            current_time = time.time()
-            if key in self.data:
-                del self.data[key]
-            elif len(self.data) >= self.max_len:
-                self.data.popitem(last=False)
-            self.data[key] = (value, current_time)
-            self._expire()
-
-    def get(self, key, default=None):
-        with self.lock:
-            self._expire()
-            if key in self.data:
-                value, timestamp = self.data[key]
-                if time.time() - timestamp <= self.max_age_seconds:
-                    return value
-                else:
-                    del self.data[key]
+        self.is_negative = is_negative
+        self.max_bytes = max_bytes
+        self.admission = admission
+        self.sizeof = sizeof
+        self.namespace = namespace
+        self.l2 = l2
+        self.l2_ttl = l2_ttl
+        self.encode = encode
+        self.decode = decode
+        self.l2_hits = 0
+        self.l2_misses = 0
+        self.l2_errors = 0
+        self.l2_conflicts = 0
+        self.bytes = 0
+        self.evictions = {"ttl": 0, "size": 0, "invalidation": 0}
+        self.rejections = 0
+        self.load_seconds = 0.0
+        self.max_load_seconds = 0.0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.coalesced = 0
+        self.load_errors = 0
+        self.data: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        if name:
+            cache_registry.register(name, self.stats)
+
+    def _jittered(self, seconds: float) -> float:
+        if not self.jitter:
+            return seconds
+        return seconds * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _victims(self, key: Hashable, incoming: int) -> List[Hashable]:
+        """Least recently used keys to evict so `key` fits with `incoming` bytes, nothing is evicted yet."""
+        replaced = self.data.get(key)
+        count = len(self.data) - (replaced is not None)
+        size = self.bytes - (replaced.size if replaced is not None else 0)
+        victims = []
+        for victim in self.data:
+            if count < self.max_len and (self.max_bytes is None or size + incoming <= self.max_bytes):
+                break
+            if victim == key:
+                continue
+            victims.append(victim)
+            count -= 1
+            size -= self.data[victim].size
+        return victims
+
+    def _remove(self, key: Hashable) -> Optional[CacheEntry]:
+        entry = self.data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+        return entry
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None) -> bool:
+        """
+        Store a value in process, evicting least recently used entries to make room.
+        :param version: Version of the shared entry, if the value went through the L2
+        :return: False if the value was not admitted
+        """
+        size = self.sizeof(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            self.rejections += 1
+            return False
+        victims = self._victims(key, size)
+        now = time.monotonic()
+        live_victims = [victim for victim in victims if now < self.data[victim].stale_until]
+        if (
+                key not in self.data
+                and live_victims
+                and self.admission is not None
+                and self.admission.frequency(key) <= max(self.admission.frequency(victim) for victim in live_victims)
+        ):
+            # Admission is decided against every victim at once, a rejected value evicts nothing
+            self.rejections += 1
+            return False
+        self._remove(key)
+        for victim in victims:
+            expired = now >= self.data[victim].stale_until
+            self._remove(victim)
+            self.evictions["ttl" if expired else "size"] += 1
+        negative = self.is_negative(value)
+        expires_at = time.monotonic() + self._jittered(self.negative_ttl if negative else self.ttl)
+        self.data[key] = CacheEntry(
+            value=value,
+            expires_at=expires_at,
+            stale_until=expires_at + self.stale_ttl,
+            negative=negative,
+            size=size,
+            version=version,
+        )
+        self.bytes += size
+        return True
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Get a fresh value without loading, recording a hit or touching the LRU order."""
+        entry = self.data.get(key)
+        if entry is None or time.monotonic() >= entry.expires_at:
             return default
+        return entry.value
+
+    def invalidate(self, key: Hashable):
+        """Drop a key in this process only. A load in flight still answers its callers but is not cached."""
+        self._inflight.pop(key, None)
+        if self._remove(key) is not None:
+            self.evictions["invalidation"] += 1
+
+    async def invalidate_shared(self, key: Hashable):
+        """Drop a key in this process and in the L2, so no worker reuses the shared value."""
+        self.invalidate(key)
+        if self.l2 is not None:
+            try:
+                await self.l2.invalidate(self.namespace, str(key))
+            except Exception as exc:
+                self.l2_errors += 1
+                logger.warning(f"Shared cache invalidation of {key!r} failed: {exc}")
+
+    def clear(self):
+        self._inflight.clear()
+        self.evictions["invalidation"] += len(self.data)
+        self.data.clear()
+        self.bytes = 0
 
-    def __contains__(self, key):
-        with self.lock:
-            self._expire()
-            return key in self.data
+    def __contains__(self, key: Hashable):
+        entry = self.data.get(key)
+        return entry is not None and time.monotonic() < entry.stale_until
 
     def __len__(self):
-        with self.lock:
-            self._expire()
-            return len(self.data)
+        return len(self.data)
 
-    def keys(self):
-        with self.lock:
-            self._expire()
-            return list(self.data.keys())
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Get the value of `key`, calling `loader` when it is missing or expired.
+        :param key: Cache key
+        :param loader: Coroutine function producing the value
+        :raises Exception: Whatever the loader raised, when there is no stale value to serve
+        """
+        if self.admission is not None:
+            self.admission.increment(key)
+        entry = self.data.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            if now < entry.expires_at:
+                self.hits += 1
+                self.data.move_to_end(key)
+                return entry.value
+            if now < entry.stale_until:
+                self.stale_hits += 1
+                self.data.move_to_end(key)
+                if key not in self._inflight:
+                    self._start_load(key, loader)
+                return entry.value
+            self._remove(key)
+            self.evictions["ttl"] += 1
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._start_load(key, loader)
+        else:
+            self.coalesced += 1
+        # A cancelled caller must not cancel the load other callers are waiting for
+        value, _, _ = await asyncio.shield(task)
+        return value
 
-    def values(self):
-        with self.lock:
-            self._expire()
-            return [value for value, _ in self.data.values()]
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[int], bool]:
+        """
+        Read through the L2, then call the loader and share its result.
+        :return: The value, its shared version and whether it may be cached
+        """
+        if self.l2 is None:
+            return await loader(), None, True
+        shared_key = str(key)
+        try:
+            shared = await self.l2.get(self.namespace, shared_key)
+            seen = shared.version if shared is not None else 0
+        except Exception as exc:
+            self.l2_errors += 1
+            logger.warning(f"Shared cache read of {key!r} failed: {exc}")
+            shared = seen = None
+        if shared is not None and shared.live:
+            self.l2_hits += 1
+            return self.decode(shared.value) if shared.value is not None else None, shared.version, True
+        self.l2_misses += 1
+        value = await loader()
+        if seen is None:
+            # Without the version seen there is nothing safe to compare against, keep the value local
+            return value, None, True
+        try:
+            encoded = self.encode(value) if value is not None else None
+            version = await self.l2.set(self.namespace, shared_key, encoded, self.l2_ttl or self.ttl, seen)
+        except Exception as exc:
+            self.l2_errors += 1
+            logger.warning(f"Shared cache write of {key!r} failed: {exc}")
+            return value, None, True
+        if version is None:
+            # Invalidated or written by another worker during the load, the value may be outdated
+            self.l2_conflicts += 1
+            return value, None, False
+        return value, version, True
 
-    def items(self):
-        with self.lock:
-            self._expire()
-            return [(key, value) for key, (value, _) in self.data.items()]
+    async def _timed_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Tuple[Any, Optional[int], bool]:
+        started = time.perf_counter()
+        try:
+            return await self._load(key, loader)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.load_seconds += elapsed
+            self.max_load_seconds = max(self.max_load_seconds, elapsed)
 
-    def clear(self):
-        with self.lock:
-            self.data.clear()
+    def _start_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        self.loads += 1
+        task = self._inflight[key] = asyncio.ensure_future(self._timed_load(key, loader))
+        task.add_done_callback(lambda done: self._finish_load(key, done))
+        return task
+
+    def _finish_load(self, key: Hashable, task: asyncio.Future):
+        # An invalidation during the load dropped it from `_inflight`, its value may predate the change
+        current = self._inflight.get(key) is task
+        if current:
+            del self._inflight[key]
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            self.load_errors += 1
+            logger.warning(f"Cache load of {key!r} failed: {exc}")
+            return
+        value, version, cacheable = task.result()
+        if current and cacheable:
+            self.set(key, value, version=version)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.data),
+            "max_len": self.max_len,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": dict(self.evictions),
+            "rejections": self.rejections,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+            "load_errors": self.load_errors,
+            "load_ms_avg": round(self.load_seconds * 1000 / self.loads, 3) if self.loads else None,
+            "load_ms_max": round(self.max_load_seconds * 1000, 3),
+            "inflight": len(self._inflight),
+            "l2": type(self.l2).__name__ if self.l2 is not None else None,
+            "l2_hits": self.l2_hits,
+            "l2_misses": self.l2_misses,
+            "l2_errors": self.l2_errors,
+            "l2_conflicts": self.l2_conflicts,
+        }
+
+
+def cached(cache: AsyncCache, key: Callable[..., Hashable]):
+    """
+    Cache the results of an async function in an `AsyncCache`.
+    :param cache: AsyncCache
+    :param key: Called with the arguments of the function, returns the cache key
+    """
+
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await cache.get_or_load(key(*args, **kwargs), lambda: func(*args, **kwargs))
 
-    def __str__(self):
-        with self.lock:
-            self._expire()
-            return str({key: value for key, (value, _) in self.data.items()})
+        wrapper.cache = cache
+        return wrapper
 
-    def __repr__(self):
-        return f"ExpiringDict(max_len={self.max_len}, max_age_seconds={self.max_age_seconds})"
+    return decorator
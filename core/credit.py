@@ -1,17 +1,22 @@
 import hashlib
 import hmac
 import time
-from typing import List
+from typing import List, Optional
 
 import aiohttp
 from loguru import logger
-from pydantic import SecretStr, BaseModel, Field
+from pydantic import SecretStr, BaseModel, Field, create_model
 
+from .cache import AsyncCache, cached
 from .openai import OpenAICredential, OpenAI
-from .openai.cell import UserMessage
+from .openai.cell import UserMessage, SystemMessage
 from .utils import Card, RepoSetting
 
 
+credit_cache = AsyncCache(ttl=60 * 5, stale_ttl=60, max_len=1000, name="credit")
+"""Card and credential per contributor card id, failed lookups are not cached"""
+
+
 class CreditFetcher:
     @staticmethod
     async def fetch(
@@ -39,6 +44,7 @@ class CreditFetcher:
                     raise Exception(f"Request failed with status: {response.status}")
 
     @staticmethod
+    @cached(credit_cache, key=lambda repo_setting, dash_api, token_secret: (repo_setting.contributor, dash_api))
     async def get(
             repo_setting: RepoSetting,
             dash_api: str,
@@ -69,7 +75,7 @@ class AIPromptProcessor:
             title: str,
             body: str,
             issue_url: str,
-            labels: List,
+            labels: List[str],
             oai_credential: OpenAICredential,
             credit_card: Card
     ):
@@ -80,7 +86,7 @@ class AIPromptProcessor:
             f"Issue: {title}"
             f"\nBody: {body}"
             f"\nIssue URL: {issue_url}"
-            f"\nLabels: {', '.join([label.name for label in labels])}"
+            f"\nLabels: {', '.join(labels)}"
             f"\n\nPlease select the most appropriate label for this issue."
             f"\nThe number of labels is limited to 0~3."
         )
@@ -95,3 +101,63 @@ class AIPromptProcessor:
         except Exception as e:
             logger.error(f"Failed to get labels: {e}")
             return None
+
+    @staticmethod
+    async def triage(
+            title: str,
+            body: str,
+            repo_details: str,
+            oai_credential: OpenAICredential,
+            credit_card: Card,
+            labels: Optional[List[str]] = None,
+            title_rule: Optional[str] = None,
+            body_rule: Optional[str] = None,
+            language: str = "English",
+    ):
+        """
+        Label, retitle and summarize the issue with one structured extraction.
+        Only the parts whose rule is given are requested, the issue is sent once.
+        :param labels: Available labels, None to skip labelling
+        :param title_rule: Title format rule, None to skip the title
+        :param body_rule: Body summary rule, None to skip the summary
+        :param language: Language of the body summary
+        :return: Model with `best_labels`, `issue_title` and/or `body_summary`, None on failure
+        """
+        fields = {}
+        tasks = []
+        if labels is not None:
+            fields["best_labels"] = (List[str], Field([], description="few best labels, 0~3"))
+            tasks.append(
+                f"Labels: select the most appropriate labels from: {', '.join(labels)}"
+                f"\nThe number of labels is limited to 0~3."
+            )
+        if title_rule is not None:
+            fields["issue_title"] = (str, Field(..., description="Improved issue title"))
+            tasks.append(f"Title: improve the title of this issue in English.\nFormat: {title_rule}")
+        if body_rule is not None:
+            fields["body_summary"] = (str, Field(..., description="Summary of the issue body"))
+            tasks.append(f"Summary: standardize the body of this issue in {language}.\nRule: {body_rule}")
+        if not fields:
+            return None
+        response_model = create_model("IssueTriage", __doc__="Triage result of the issue", **fields)
+        prompt = (
+            f"Issue:"
+            f"\n## {title}"
+            f"\n{body}"
+            f"\n\n" + "\n\n".join(tasks)
+        )
+        try:
+            return await OpenAI(
+                model=credit_card.apiModel,
+                messages=[
+                    SystemMessage(content="You are a github bot, you are helping to triage the issue."),
+                    UserMessage(content=repo_details),
+                    UserMessage(content=prompt)
+                ]
+            ).extract(
+                response_model=response_model,
+                session=oai_credential
+            )
+        except Exception as e:
+            logger.error(f"Failed to triage issue: {e}")
+            return None
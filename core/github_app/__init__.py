@@ -0,0 +1,28 @@
+from .app_auth import CachedAppAuth  # noqa
+from .executor import GithubExecutor, github_executor  # noqa
+from .http_cache import GithubHttpCache, create_http_cache_backend, install_http_cache  # noqa
+from .repo import RepoClient, PyGithubRepoClient, RestRepoClient, create_repo_client, set_default_backend  # noqa
+from .rest import GithubApiError, GithubRestClient, github_rest_client, close_rest_client  # noqa
+from .tokens import InstallationTokenCache, get_token_cache  # noqa
+from .writes import IssueWriteBuffer  # noqa
+
+__all__ = [
+    "CachedAppAuth",
+    "GithubExecutor",
+    "github_executor",
+    "GithubHttpCache",
+    "create_http_cache_backend",
+    "install_http_cache",
+    "RepoClient",
+    "PyGithubRepoClient",
+    "RestRepoClient",
+    "create_repo_client",
+    "set_default_backend",
+    "GithubApiError",
+    "GithubRestClient",
+    "github_rest_client",
+    "close_rest_client",
+    "InstallationTokenCache",
+    "get_token_cache",
+    "IssueWriteBuffer",
+]
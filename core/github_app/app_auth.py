@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Union
+
+from github import Consts
+from github.Auth import AppAuth
+from loguru import logger
+
+JWT_EXPIRY = Consts.MAX_JWT_EXPIRY
+"""GitHub accepts app JWTs for at most 10 minutes"""
+JWT_REUSE_MARGIN = 60
+"""Stop handing out a JWT this many seconds before it expires"""
+JWT_REFRESH_MARGIN = 120
+"""Sign a replacement in the background this many seconds before expiry"""
+
+
+class CachedAppAuth(AppAuth):
+    """
+    GitHub App authentication that reuses its RS256 JWT instead of signing one per request.
+
+    A replacement is signed in a worker thread shortly before the current JWT expires,
+    so the event loop only pays for signing when no valid JWT is cached at all.
+    """
+
+    def __init__(
+            self,
+            app_id: Union[int, str],
+            private_key: str,
+            jwt_expiry: int = JWT_EXPIRY,
+            reuse_margin: int = JWT_REUSE_MARGIN,
+            refresh_margin: int = JWT_REFRESH_MARGIN,
+    ):
+        """
+        :param app_id: GitHub App id
+        :param private_key: PEM encoded private key of the app
+        :param jwt_expiry: Lifetime of a signed JWT in seconds
+        :param reuse_margin: Seconds before expiry when a cached JWT is no longer served
+        :param refresh_margin: Seconds before expiry when a background re-sign starts
+        """
+        super().__init__(app_id, private_key, jwt_expiry=jwt_expiry)
+        self.reuse_margin = reuse_margin
+        self.refresh_margin = refresh_margin
+        self.sign_count = 0
+        self.sign_seconds = 0.0
+        self.last_sign_seconds = 0.0
+        self.reuse_count = 0
+        self._jwt: Optional[str] = None
+        self._jwt_expires_at = 0.0
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jwt-sign")
+
+    def _sign(self, expiration: Optional[int] = None) -> str:
+        start = time.perf_counter()
+        token = super().create_jwt(expiration)
+        elapsed = time.perf_counter() - start
+        self.sign_count += 1
+        self.sign_seconds += elapsed
+        self.last_sign_seconds = elapsed
+        return token
+
+    def _sign_and_store(self) -> str:
+        expires_at = time.time() + self._jwt_expiry
+        token = self._sign()
+        with self._lock:
+            self._jwt, self._jwt_expires_at = token, expires_at
+        return token
+
+    def _refresh_in_background(self):
+        def refresh():
+            try:
+                self._sign_and_store()
+            except Exception as exc:
+                logger.error(f"Failed to sign GitHub App JWT: {exc}")
+            finally:
+                self._refreshing = False
+
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        self._executor.submit(refresh)
+
+    def _cached(self) -> Optional[str]:
+        remaining = self._jwt_expires_at - time.time()
+        if self._jwt is None or remaining <= self.reuse_margin:
+            return None
+        if remaining <= self.refresh_margin:
+            self._refresh_in_background()
+        self.reuse_count += 1
+        return self._jwt
+
+    def create_jwt(self, expiration: Optional[int] = None) -> str:
+        """
+        Return the cached JWT, signing a new one only when none is valid.
+        An explicit `expiration` always signs a fresh, uncached JWT.
+        """
+        if expiration is not None:
+            return self._sign(expiration)
+        return self._cached() or self._sign_and_store()
+
+    async def warm(self):
+        """Make sure a valid JWT is cached, signing it in a worker thread."""
+        if self._cached() is None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._sign_and_store)
+
+    def stats(self) -> dict:
+        return {
+            "sign_count": self.sign_count,
+            "reuse_count": self.reuse_count,
+            "sign_seconds_total": round(self.sign_seconds, 6),
+            "sign_seconds_avg": round(self.sign_seconds / self.sign_count, 6) if self.sign_count else 0.0,
+            "sign_seconds_last": round(self.last_sign_seconds, 6),
+            "expires_in": max(0, round(self._jwt_expires_at - time.time())),
+        }
+
+
+async def create_app_jwt(auth: AppAuth) -> str:
+    """
+    Get an app JWT without signing on the event loop when the auth caches it.
+    :param auth: Auth of the GithubIntegration
+    """
+    if isinstance(auth, CachedAppAuth):
+        await auth.warm()
+    return auth.create_jwt()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+from loguru import logger
+
+GITHUB_EXECUTOR_WORKERS = 16
+"""Threads available to blocking PyGithub calls"""
+GITHUB_INSTALLATION_CONCURRENCY = 4
+"""Concurrent PyGithub calls allowed per installation"""
+
+T = TypeVar("T")
+
+
+class CallStats:
+    """Counters of one operation name."""
+    __slots__ = ("calls", "errors", "queue_seconds", "call_seconds", "max_queue_seconds", "max_call_seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.queue_seconds = 0.0
+        self.call_seconds = 0.0
+        self.max_queue_seconds = 0.0
+        self.max_call_seconds = 0.0
+
+    def record(self, queued: float, elapsed: float, failed: bool):
+        self.calls += 1
+        self.errors += int(failed)
+        self.queue_seconds += queued
+        self.call_seconds += elapsed
+        self.max_queue_seconds = max(self.max_queue_seconds, queued)
+        self.max_call_seconds = max(self.max_call_seconds, elapsed)
+
+    def dump(self) -> dict:
+        calls = self.calls or 1
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "queue_seconds_avg": round(self.queue_seconds / calls, 6),
+            "queue_seconds_max": round(self.max_queue_seconds, 6),
+            "call_seconds_avg": round(self.call_seconds / calls, 6),
+            "call_seconds_max": round(self.max_call_seconds, 6),
+        }
+
+
+class GithubExecutor:
+    """
+    Runs blocking PyGithub calls in a sized thread pool so they never block the event loop.
+    Calls of one installation are additionally limited by a semaphore, so a busy repository
+    cannot take every thread.
+    """
+
+    def __init__(
+            self,
+            max_workers: int = GITHUB_EXECUTOR_WORKERS,
+            per_installation: int = GITHUB_INSTALLATION_CONCURRENCY,
+    ):
+        """
+        :param max_workers: Size of the thread pool
+        :param per_installation: Concurrent calls allowed per installation id
+        """
+        self.max_workers = max_workers
+        self.per_installation = per_installation
+        self.in_flight = 0
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="github")
+        self._semaphores: Dict[Hashable, asyncio.Semaphore] = {}
+        self._stats: Dict[str, CallStats] = {}
+
+    def _semaphore(self, key: Hashable) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = self._semaphores[key] = asyncio.Semaphore(self.per_installation)
+        return semaphore
+
+    async def run(
+            self,
+            func: Callable[..., T],
+            *args: Any,
+            installation_id: Optional[int] = None,
+            name: Optional[str] = None,
+            **kwargs: Any
+    ) -> T:
+        """
+        Run `func(*args, **kwargs)` in the pool and await its result.
+        :param func: Blocking callable
+        :param installation_id: Installation the call is made for, used for the concurrency limit
+        :param name: Operation name used in metrics, defaults to the callable name
+        """
+        name = name or getattr(func, "__name__", "call")
+        enqueued = time.perf_counter()
+        started = enqueued
+
+        def call():
+            nonlocal started
+            started = time.perf_counter()
+            return func(*args, **kwargs)
+
+        failed = False
+        self.in_flight += 1
+        try:
+            async with self._semaphore(installation_id):
+                return await asyncio.get_running_loop().run_in_executor(self._pool, call)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.in_flight -= 1
+            finished = time.perf_counter()
+            queued = started - enqueued
+            elapsed = finished - started
+            self._stats.setdefault(name, CallStats()).record(queued, elapsed, failed)
+            if elapsed > 5:
+                logger.warning(f"Slow GitHub call {name} took {elapsed:.2f}s --installation {installation_id}")
+
+    def stats(self) -> dict:
+        """Queue time and call duration per operation."""
+        return {
+            "max_workers": self.max_workers,
+            "per_installation": self.per_installation,
+            "in_flight": self.in_flight,
+            "operations": {name: stats.dump() for name, stats in self._stats.items()},
+        }
+
+
+github_executor = GithubExecutor()
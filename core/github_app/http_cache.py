@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import os
+import pathlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Literal, NamedTuple, Optional
+
+import requests
+from github.Requester import HTTPSRequestsConnectionClass, Requester
+from loguru import logger
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+GITHUB_HTTP_CACHE_SIZE = 64 * 1024 * 1024
+"""Bytes of response bodies kept for revalidation"""
+GITHUB_HTTP_CACHE_ENTRY_SIZE = 1024 * 1024
+"""Larger responses are not cached"""
+
+HttpCacheBackendName = Literal["memory", "filesystem", "mongo"]
+
+# Describe the body as sent on the wire, not the decoded copy that is stored
+_UNSTORED_HEADERS = frozenset(("content-encoding", "content-length", "transfer-encoding"))
+
+
+class CachedResponse(NamedTuple):
+    etag: str
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+    stored_at: float
+
+    @property
+    def size(self) -> int:
+        return len(self.body)
+
+    def dump_meta(self) -> dict:
+        return {"etag": self.etag, "status": self.status, "headers": self.headers, "stored_at": self.stored_at}
+
+
+class HttpCacheBackend(ABC):
+    """Storage of `CachedResponse` by request key, bounded by `max_bytes` of response bodies."""
+
+    name: str
+
+    def __init__(self, max_bytes: int = GITHUB_HTTP_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.evictions = 0
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CachedResponse]:
+        """:return: The stored response, None if missing"""
+
+    @abstractmethod
+    def set(self, key: str, response: CachedResponse):
+        """Store a response, evicting the least recently used ones above `max_bytes`."""
+
+    @abstractmethod
+    def size(self) -> Optional[int]:
+        """
+        Read from counters, without I/O, as it is called from the event loop for stats.
+        :return: Number of stored responses, None while it is not known
+        """
+
+    def stored_bytes(self) -> Optional[int]:
+        """:return: Bytes of stored bodies from counters, None when the backend does not track them"""
+        return None
+
+
+class MemoryHttpCache(HttpCacheBackend):
+    """LRU of responses in process, shared by every PyGithub session."""
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int = GITHUB_HTTP_CACHE_SIZE):
+        super().__init__(max_bytes)
+        self.bytes = 0
+        self._data: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            response = self._data.get(key)
+            if response is not None:
+                self._data.move_to_end(key)
+            return response
+
+    def set(self, key: str, response: CachedResponse):
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.size
+            self._data[key] = response
+            self.bytes += response.size
+            while self.bytes > self.max_bytes and len(self._data) > 1:
+                _, victim = self._data.popitem(last=False)
+                self.bytes -= victim.size
+                self.evictions += 1
+
+    def size(self) -> Optional[int]:
+        return len(self._data)
+
+    def stored_bytes(self) -> Optional[int]:
+        return self.bytes
+
+
+class FileHttpCache(HttpCacheBackend):
+    """
+    Responses as files in a directory, kept across restarts.
+    Each file holds a JSON header line followed by the raw body. The LRU index is rebuilt
+    from file modification times on first use.
+    """
+
+    name = "filesystem"
+
+    def __init__(self, directory: str, max_bytes: int = GITHUB_HTTP_CACHE_SIZE):
+        """
+        :param directory: Cache directory, created if missing
+        :param max_bytes: Bytes of cache files kept
+        """
+        super().__init__(max_bytes)
+        self.directory = pathlib.Path(directory).expanduser()
+        self.bytes = 0
+        self._index: Optional["OrderedDict[str, int]"] = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.directory / f"{key}.cache"
+
+    def _load_index(self) -> "OrderedDict[str, int]":
+        if self._index is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            files = sorted(
+                (entry.stat().st_mtime, entry.name[:-len(".cache")], entry.stat().st_size)
+                for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.endswith(".cache")
+            )
+            self._index = OrderedDict((key, size) for _, key, size in files)
+            self.bytes = sum(self._index.values())
+        return self._index
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            index = self._load_index()
+            if key not in index:
+                return None
+            path = self._path(key)
+            try:
+                with path.open("rb") as file:
+                    meta = json.loads(file.readline())
+                    body = file.read()
+                os.utime(path)
+            except (OSError, ValueError) as exc:
+                logger.warning(f"Dropping unreadable GitHub HTTP cache file {path}: {exc}")
+                self._remove(key)
+                return None
+            index.move_to_end(key)
+            return CachedResponse(body=body, **meta)
+
+    def set(self, key: str, response: CachedResponse):
+        with self._lock:
+            index = self._load_index()
+            path = self._path(key)
+            tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+            with tmp_path.open("wb") as file:
+                file.write(json.dumps(response.dump_meta()).encode() + b"\n")
+                file.write(response.body)
+            os.replace(tmp_path, path)
+            self.bytes -= index.pop(key, 0)
+            index[key] = path.stat().st_size
+            self.bytes += index[key]
+            while self.bytes > self.max_bytes and len(index) > 1:
+                self._remove(next(iter(index)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        self.bytes -= self._index.pop(key, 0)
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def size(self) -> Optional[int]:
+        # The directory is only scanned by the first get or set, not for stats
+        return len(self._index) if self._index is not None else None
+
+    def stored_bytes(self) -> Optional[int]:
+        return self.bytes if self._index is not None else None
+
+
+class GithubHttpCache:
+    """
+    Conditional request cache of PyGithub sessions.
+
+    Every GET is revalidated with `If-None-Match`, a 304 is answered from the stored copy and
+    does not count against the rate limit. Nothing is served without asking GitHub, so the
+    cache never returns stale data. GitHub varies responses on `Authorization`, so entries are
+    keyed by credentials scope, Accept header and URL, and one installation's body is never
+    replayed for another. `resolve_scope` maps a token to a stable scope such as its
+    installation id, so entries survive the hourly rotation of installation tokens. Other
+    credentials are scoped by a hash of the header.
+    """
+
+    def __init__(
+            self,
+            backend: HttpCacheBackend,
+            max_entry_bytes: int = GITHUB_HTTP_CACHE_ENTRY_SIZE,
+            resolve_scope: Optional[Callable[[str], Optional[Hashable]]] = None,
+    ):
+        """
+        :param backend: Where responses are stored
+        :param max_entry_bytes: Larger responses are not cached
+        :param resolve_scope: Called with the token of a request, returns its scope or None if unknown
+        """
+        self.backend = backend
+        self.max_entry_bytes = max_entry_bytes
+        self.resolve_scope = resolve_scope
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+
+    def scope(self, request: requests.PreparedRequest) -> str:
+        authorization = request.headers.get("Authorization", "")
+        if self.resolve_scope is not None and authorization:
+            scope = self.resolve_scope(authorization.split(" ", 1)[-1])
+            if scope is not None:
+                return f"installation:{scope}"
+        return f"authorization:{hashlib.sha256(authorization.encode()).hexdigest()}"
+
+    def key(self, request: requests.PreparedRequest) -> str:
+        material = f"{self.scope(request)}\n{request.headers.get('Accept', '')}\n{request.url}"
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def lookup(self, key: str) -> Optional[CachedResponse]:
+        try:
+            return self.backend.get(key)
+        except Exception as exc:
+            self.errors += 1
+            logger.warning(f"GitHub HTTP cache read failed: {exc}")
+            return None
+
+    def store(self, key: str, response: requests.Response):
+        etag = response.headers.get("ETag")
+        if response.status_code != 200 or not etag or "no-store" in response.headers.get("Cache-Control", ""):
+            return
+        body = response.content
+        if len(body) > self.max_entry_bytes:
+            return
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in _UNSTORED_HEADERS}
+        try:
+            self.backend.set(key, CachedResponse(etag, response.status_code, headers, body, time.time()))
+            self.stores += 1
+        except Exception as exc:
+            self.errors += 1
+            logger.warning(f"GitHub HTTP cache write failed: {exc}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name,
+            "size": self.backend.size(),
+            "bytes": self.backend.stored_bytes(),
+            "max_bytes": self.backend.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "errors": self.errors,
+            "evictions": {"size": self.backend.evictions},
+        }
+
+
+class ConditionalCacheAdapter(HTTPAdapter):
+    """`HTTPAdapter` revalidating GET requests through a `GithubHttpCache`."""
+
+    def __init__(self, cache: GithubHttpCache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if request.method != "GET" or "If-None-Match" in request.headers:
+            return super().send(request, **kwargs)
+        key = self.cache.key(request)
+        cached = self.cache.lookup(key)
+        if cached is not None:
+            request.headers["If-None-Match"] = cached.etag
+        response = super().send(request, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            self.cache.hits += 1
+            return self._from_cache(request, cached, response)
+        self.cache.misses += 1
+        self.cache.store(key, response)
+        return response
+
+    def _from_cache(
+            self, request: requests.PreparedRequest, cached: CachedResponse, not_modified: requests.Response
+    ) -> requests.Response:
+        # Drain the empty 304 body so its connection goes back to the pool
+        not_modified.content
+        response = requests.Response()
+        response.status_code = cached.status
+        response.reason = "OK"
+        response.headers = CaseInsensitiveDict(cached.headers)
+        # Rate limit and date headers of the 304 are current
+        response.headers.update(
+            (name, value) for name, value in not_modified.headers.items() if name.lower() not in _UNSTORED_HEADERS
+        )
+        response._content = cached.body
+        response._content_consumed = True
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.elapsed = not_modified.elapsed
+        response.connection = self
+        return response
+
+
+class CachingHTTPSConnection(HTTPSRequestsConnectionClass):
+    """PyGithub connection whose session sends requests through `ConditionalCacheAdapter`."""
+
+    cache: Optional[GithubHttpCache] = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.cache is not None:
+            self.adapter = ConditionalCacheAdapter(
+                self.cache,
+                max_retries=self.retry,
+                pool_connections=self.pool_size,
+                pool_maxsize=self.pool_size,
+            )
+            self.session.mount("https://", self.adapter)
+
+
+def create_http_cache_backend(
+        backend: HttpCacheBackendName, path: str = "", max_bytes: int = GITHUB_HTTP_CACHE_SIZE
+) -> HttpCacheBackend:
+    """
+    :param backend: memory, filesystem or mongo
+    :param path: Cache directory of the filesystem backend
+    :param max_bytes: Size cap of the backend
+    """
+    if backend == "memory":
+        return MemoryHttpCache(max_bytes)
+    if backend == "filesystem":
+        return FileHttpCache(path, max_bytes)
+    if backend == "mongo":
+        from ..mongo import MongoHttpCache
+
+        return MongoHttpCache(max_bytes)
+    raise ValueError(f"Unknown GitHub HTTP cache backend: {backend}")
+
+
+def install_http_cache(
+        backend: HttpCacheBackend,
+        max_entry_bytes: int = GITHUB_HTTP_CACHE_ENTRY_SIZE,
+        resolve_scope: Optional[Callable[[str], Optional[Hashable]]] = None,
+) -> GithubHttpCache:
+    """
+    Send the HTTPS requests of PyGithub through a conditional cache. Other users of `requests`
+    are not affected. Applies to `Github` clients created afterwards.
+    :param backend: Where responses are stored
+    :param max_entry_bytes: Larger responses are not cached
+    :param resolve_scope: Maps a token to the scope its responses are cached under, see `GithubHttpCache`
+    :return: The installed cache
+    """
+    cache = GithubHttpCache(backend, max_entry_bytes=max_entry_bytes, resolve_scope=resolve_scope)
+    CachingHTTPSConnection.cache = cache
+    # `Requester.injectConnectionClasses` would also turn off connection reuse, it is meant for tests
+    setattr(Requester, "_Requester__httpsConnectionClass", CachingHTTPSConnection)
+    return cache
@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional
+
+from github import BadCredentialsException, Github, GithubIntegration, UnknownObjectException
+from github.Issue import Issue as GithubIssue
+from github.Repository import Repository as GithubRepository
+from loguru import logger
+
+from .app_auth import create_app_jwt
+from .executor import GithubExecutor, github_executor
+from .rest import GithubApiError, GithubRestClient, github_rest_client
+from .tokens import get_token_cache
+
+GithubBackend = Literal["rest", "pygithub"]
+_default_backend: GithubBackend = "rest"
+
+
+def _issue_changes(**fields) -> dict:
+    return {key: value for key, value in fields.items() if value is not None}
+
+
+class RepoClient(ABC):
+    """
+    Async interface to the GitHub operations used by the event handlers.
+    Results are plain data (REST API dicts, strings), independent of the backend.
+    """
+
+    def __init__(self, integration: GithubIntegration, full_name: str, installation_id: Optional[int] = None):
+        """
+        :param integration: GithubIntegration
+        :param full_name: owner/name of the repository
+        :param installation_id: Installation id from the payload, looked up by owner and name when missing
+        """
+        self.integration = integration
+        self.full_name = full_name
+        self.installation_id = installation_id
+
+    @abstractmethod
+    async def get_file(self, path: str) -> Optional[str]:
+        """
+        Get the decoded text of a file on the default branch.
+        :param path: File path
+        :return: str or None if the file does not exist
+        """
+
+    @abstractmethod
+    async def get_labels(self) -> List[str]:
+        """Get the names of all labels of the repository."""
+
+    @abstractmethod
+    async def get_issue(self, issue_number: int) -> dict:
+        """Get the issue as a REST API dict."""
+
+    @abstractmethod
+    async def edit_issue(
+            self,
+            issue_number: int,
+            title: Optional[str] = None,
+            body: Optional[str] = None,
+            labels: Optional[List[str]] = None,
+    ):
+        """
+        Update the title, body and/or labels of an issue in a single request.
+        :param issue_number: Issue number
+        :param title: New title, unchanged if None
+        :param body: New body, unchanged if None
+        :param labels: Full set of label names replacing the current ones, unchanged if None
+        """
+
+    @abstractmethod
+    async def add_labels(self, issue_number: int, *labels: str):
+        """Add labels to an issue."""
+
+    @abstractmethod
+    async def get_comments(self, issue_number: int) -> List[dict]:
+        """Get all comments of an issue as REST API dicts, oldest first."""
+
+    @abstractmethod
+    async def create_comment(self, issue_number: int, body: str) -> dict:
+        """Comment on an issue and return the created comment."""
+
+    @abstractmethod
+    async def edit_comment(self, issue_number: int, comment_id: int, body: str):
+        """Replace the body of an issue comment."""
+
+    @abstractmethod
+    async def get_pull(self, pull_number: int) -> dict:
+        """Get the pull request as a REST API dict."""
+
+
+class PyGithubRepoClient(RepoClient):
+    """
+    PyGithub backend. Every call runs in the `GithubExecutor` thread pool and returns plain data,
+    never lazy PyGithub objects that would do I/O on the event loop.
+    """
+
+    def __init__(
+            self,
+            integration: GithubIntegration,
+            full_name: str,
+            installation_id: Optional[int] = None,
+            executor: GithubExecutor = github_executor,
+    ):
+        super().__init__(integration, full_name, installation_id)
+        self.executor = executor
+        self._repo: Optional[GithubRepository] = None
+        self._token: Optional[str] = None
+        self._issues: Dict[int, GithubIssue] = {}
+
+    async def _run(self, func, *args, name: str, **kwargs):
+        return await self.executor.run(func, *args, installation_id=self.installation_id, name=name, **kwargs)
+
+    async def _get_installation_id(self) -> int:
+        if self.installation_id is None:
+            owner, repo_name = self.full_name.split("/", 1)
+            token_cache = get_token_cache(self.integration)
+            self.installation_id = await self._run(
+                token_cache.get_installation_id, owner, repo_name, name="get_installation_id"
+            )
+        return self.installation_id
+
+    async def get_repo(self) -> GithubRepository:
+        """
+        Get the PyGithub repository object, authenticated with the cached installation token.
+        It is created lazily and does not fetch the repository itself.
+        """
+        if self._repo is None:
+            installation_id = await self._get_installation_id()
+            self._token = await get_token_cache(self.integration).aget_token(installation_id)
+            self._repo = Github(login_or_token=self._token).get_repo(self.full_name, lazy=True)
+        return self._repo
+
+    async def _call(self, request: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run a call, once more with a new installation token if GitHub rejects the cached one.
+        :param request: Gets the repository or issue objects and runs the call, so a retry uses the new token
+        """
+        try:
+            return await request()
+        except BadCredentialsException:
+            logger.warning(f"Installation token of {self.full_name} was rejected, fetching a new one")
+            get_token_cache(self.integration).invalidate(self.installation_id, self._token)
+            # Repository and issue objects hold the rejected token
+            self._repo = None
+            self._issues.clear()
+            return await request()
+
+    async def _get_issue(self, issue_number: int) -> GithubIssue:
+        issue = self._issues.get(issue_number)
+        if issue is None:
+            repo = await self.get_repo()
+            issue = await self._run(repo.get_issue, issue_number, name="get_issue")
+            self._issues[issue_number] = issue
+        return issue
+
+    async def get_file(self, path: str) -> Optional[str]:
+        async def request():
+            repo = await self.get_repo()
+
+            def get_file():
+                try:
+                    contents = repo.get_contents(path)
+                except UnknownObjectException:
+                    return None
+                if isinstance(contents, list):
+                    return None
+                return contents.decoded_content.decode()
+
+            return await self._run(get_file, name="get_contents")
+
+        return await self._call(request)
+
+    async def get_labels(self) -> List[str]:
+        async def request():
+            repo = await self.get_repo()
+            return await self._run(lambda: [label.name for label in repo.get_labels()], name="get_labels")
+
+        return await self._call(request)
+
+    async def get_issue(self, issue_number: int) -> dict:
+        async def request():
+            issue = await self._get_issue(issue_number)
+            return issue.raw_data
+
+        return await self._call(request)
+
+    async def edit_issue(
+            self,
+            issue_number: int,
+            title: Optional[str] = None,
+            body: Optional[str] = None,
+            labels: Optional[List[str]] = None,
+    ):
+        changes = _issue_changes(title=title, body=body, labels=labels)
+        if not changes:
+            return
+
+        async def request():
+            issue = await self._get_issue(issue_number)
+            await self._run(issue.edit, name="edit_issue", **changes)
+
+        await self._call(request)
+
+    async def add_labels(self, issue_number: int, *labels: str):
+        if not labels:
+            return
+
+        async def request():
+            issue = await self._get_issue(issue_number)
+            await self._run(issue.add_to_labels, *labels, name="add_labels")
+
+        await self._call(request)
+
+    async def get_comments(self, issue_number: int) -> List[dict]:
+        async def request():
+            issue = await self._get_issue(issue_number)
+            return await self._run(
+                lambda: [comment.raw_data for comment in issue.get_comments()], name="get_comments"
+            )
+
+        return await self._call(request)
+
+    async def create_comment(self, issue_number: int, body: str) -> dict:
+        async def request():
+            issue = await self._get_issue(issue_number)
+            comment = await self._run(issue.create_comment, body, name="create_comment")
+            return comment.raw_data
+
+        return await self._call(request)
+
+    async def edit_comment(self, issue_number: int, comment_id: int, body: str):
+        async def request():
+            issue = await self._get_issue(issue_number)
+
+            def edit_comment():
+                issue.get_comment(comment_id).edit(body)
+
+            await self._run(edit_comment, name="edit_comment")
+
+        await self._call(request)
+
+    async def get_pull(self, pull_number: int) -> dict:
+        async def request():
+            repo = await self.get_repo()
+            return await self._run(lambda: repo.get_pull(pull_number).raw_data, name="get_pull")
+
+        return await self._call(request)
+
+
+class RestRepoClient(RepoClient):
+    """
+    Native async backend on the shared `GithubRestClient` connection pool, no thread per call.
+    Reads are revalidated with ETags scoped to the installation.
+    """
+
+    def __init__(
+            self,
+            integration: GithubIntegration,
+            full_name: str,
+            installation_id: Optional[int] = None,
+            rest: GithubRestClient = github_rest_client,
+    ):
+        super().__init__(integration, full_name, installation_id)
+        self.rest = rest
+
+    async def _token(self) -> str:
+        token_cache = get_token_cache(self.integration)
+        if self.installation_id is None:
+            owner, repo_name = self.full_name.split("/", 1)
+            jwt = await create_app_jwt(self.integration.auth)
+            self.installation_id = await self.rest.get_repo_installation(owner, repo_name, jwt)
+        return await token_cache.aget_token(self.installation_id)
+
+    async def _call(self, request: Callable[[str], Awaitable[Any]]) -> Any:
+        """
+        Send a request with the installation token. A token GitHub rejects, e.g. once the app was
+        reinstalled, is dropped from the cache and the request is sent once more with a new one.
+        :param request: Called with the token, sends the request
+        """
+        token = await self._token()
+        try:
+            return await request(token)
+        except GithubApiError as exc:
+            if exc.status != 401:
+                raise
+            logger.warning(f"Installation token of {self.full_name} was rejected, fetching a new one")
+            get_token_cache(self.integration).invalidate(self.installation_id, token)
+            return await request(await self._token())
+
+    async def get_file(self, path: str) -> Optional[str]:
+        return await self._call(
+            lambda token: self.rest.get_contents(self.full_name, path, token, scope=self.installation_id)
+        )
+
+    async def get_labels(self) -> List[str]:
+        labels = await self._call(lambda token: self.rest.get_labels(self.full_name, token, scope=self.installation_id))
+        return [label["name"] for label in labels]
+
+    async def get_issue(self, issue_number: int) -> dict:
+        return await self._call(
+            lambda token: self.rest.get_issue(self.full_name, issue_number, token, scope=self.installation_id)
+        )
+
+    async def edit_issue(
+            self,
+            issue_number: int,
+            title: Optional[str] = None,
+            body: Optional[str] = None,
+            labels: Optional[List[str]] = None,
+    ):
+        changes = _issue_changes(title=title, body=body, labels=labels)
+        if not changes:
+            return
+        await self._call(lambda token: self.rest.edit_issue(self.full_name, issue_number, token, **changes))
+
+    async def add_labels(self, issue_number: int, *labels: str):
+        if not labels:
+            return
+        await self._call(lambda token: self.rest.add_labels(self.full_name, issue_number, list(labels), token))
+
+    async def get_comments(self, issue_number: int) -> List[dict]:
+        return await self._call(
+            lambda token: self.rest.get_comments(self.full_name, issue_number, token, scope=self.installation_id)
+        )
+
+    async def create_comment(self, issue_number: int, body: str) -> dict:
+        return await self._call(lambda token: self.rest.create_comment(self.full_name, issue_number, body, token))
+
+    async def edit_comment(self, issue_number: int, comment_id: int, body: str):
+        await self._call(lambda token: self.rest.edit_comment(self.full_name, comment_id, body, token))
+
+    async def get_pull(self, pull_number: int) -> dict:
+        return await self._call(
+            lambda token: self.rest.get_pull(self.full_name, pull_number, token, scope=self.installation_id)
+        )
+
+
+def set_default_backend(backend: GithubBackend):
+    """
+    Select the backend used by `create_repo_client`.
+    :param backend: rest or pygithub
+    """
+    global _default_backend
+    if backend not in ("rest", "pygithub"):
+        raise ValueError(f"Unknown GitHub backend: {backend}")
+    _default_backend = backend
+
+
+def create_repo_client(
+        integration: GithubIntegration,
+        full_name: str,
+        installation_id: Optional[int] = None,
+        backend: Optional[GithubBackend] = None,
+) -> RepoClient:
+    """
+    Create a client for a repository with the selected backend.
+    :param integration: GithubIntegration
+    :param full_name: owner/name of the repository
+    :param installation_id: Installation id from the payload
+    :param backend: rest or pygithub, defaults to the backend set by `set_default_backend`
+    """
+    backend = backend or _default_backend
+    if backend == "pygithub":
+        return PyGithubRepoClient(integration, full_name, installation_id)
+    return RestRepoClient(integration, full_name, installation_id)
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import base64
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Hashable, List, Optional, Tuple
+
+import aiohttp
+from loguru import logger
+
+from .. import jsonlib
+
+GITHUB_API_URL = "https://api.github.com"
+GITHUB_POOL_SIZE = 100
+"""Keep-alive connections shared by the whole process"""
+GITHUB_ETAG_CACHE_SIZE = 1024
+"""Responses kept for ETag revalidation"""
+
+
+class GithubApiError(Exception):
+    """Raised when the GitHub REST API answers with an error status."""
+
+    def __init__(self, status: int, message: str, url: str):
+        self.status = status
+        self.message = message
+        self.url = url
+        super().__init__(f"GitHub API error {status} on {url}: {message}")
+
+
+class GithubRestClient:
+    """
+    Minimal async GitHub REST client for the endpoints this app uses.
+
+    One `aiohttp.ClientSession` with a keep-alive connection pool is shared by the process.
+    GET requests made with a `scope` are revalidated with `If-None-Match`, and a 304 is served
+    from the local copy without counting against the rate limit.
+    """
+
+    def __init__(
+            self,
+            base_url: str = GITHUB_API_URL,
+            pool_size: int = GITHUB_POOL_SIZE,
+            etag_cache_size: int = GITHUB_ETAG_CACHE_SIZE,
+            timeout: float = 30,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.etag_cache_size = etag_cache_size
+        self.timeout = timeout
+        self.requests = 0
+        self.not_modified = 0
+        self.revalidated = 0
+        self.etag_evictions = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_lock: Optional[asyncio.Lock] = None
+        self._etags: "OrderedDict[Tuple[Hashable, str], Tuple[str, Any, Optional[str]]]" = OrderedDict()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            if self._session_lock is None:
+                self._session_lock = asyncio.Lock()
+            async with self._session_lock:
+                if self._session is None or self._session.closed:
+                    self._session = aiohttp.ClientSession(
+                        connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+                        timeout=aiohttp.ClientTimeout(total=self.timeout),
+                        headers={
+                            "Accept": "application/vnd.github+json",
+                            "X-GitHub-Api-Version": "2022-11-28",
+                            "User-Agent": "contributor-app",
+                        },
+                    )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _remember(self, key: Tuple[Hashable, str], etag: str, data: Any, next_url: Optional[str]):
+        self._etags[key] = (etag, data, next_url)
+        self._etags.move_to_end(key)
+        while len(self._etags) > self.etag_cache_size:
+            self._etags.popitem(last=False)
+            self.etag_evictions += 1
+
+    async def _request(
+            self,
+            method: str,
+            url: str,
+            token: str,
+            scheme: str = "token",
+            scope: Optional[Hashable] = None,
+            **kwargs: Any
+    ) -> Tuple[Any, Optional[str]]:
+        """
+        :return: decoded body and the `next` page url, if any
+        """
+        if not url.startswith("http"):
+            url = f"{self.base_url}{url}"
+        headers = {"Authorization": f"{scheme} {token}"}
+        cache_key = (scope, url) if scope is not None and method == "GET" else None
+        cached = self._etags.get(cache_key) if cache_key else None
+        if cached:
+            headers["If-None-Match"] = cached[0]
+        session = await self.get_session()
+        self.requests += 1
+        async with session.request(method, url, headers=headers, **kwargs) as response:
+            if response.status == 304 and cached:
+                self.not_modified += 1
+                self._etags.move_to_end(cache_key)
+                return cached[1], cached[2]
+            if cached:
+                self.revalidated += 1
+            raw = await response.read()
+            data = jsonlib.loads(raw) if raw else None
+            if response.status >= 400:
+                message = data.get("message", "") if isinstance(data, dict) else ""
+                raise GithubApiError(response.status, message, url)
+            next_link = response.links.get("next")
+            next_url = str(next_link["url"]) if next_link else None
+            etag = response.headers.get("ETag")
+            if cache_key and etag:
+                self._remember(cache_key, etag, data, next_url)
+            return data, next_url
+
+    async def request(self, method: str, url: str, token: str, **kwargs: Any) -> Any:
+        data, _ = await self._request(method, url, token, **kwargs)
+        return data
+
+    async def paginate(self, url: str, token: str, scope: Optional[Hashable] = None, **kwargs: Any) -> List[Any]:
+        """Follow `Link: rel=next` headers and concatenate every page."""
+        items: List[Any] = []
+        next_url: Optional[str] = url
+        while next_url:
+            data, next_url = await self._request("GET", next_url, token, scope=scope, **kwargs)
+            items.extend(data or [])
+            kwargs.pop("params", None)
+        return items
+
+    # Installation authentication
+
+    async def create_installation_token(self, installation_id: int, jwt: str) -> Tuple[str, datetime]:
+        """
+        Exchange an app JWT for an installation access token.
+        :return: token and its expiry
+        """
+        data = await self.request(
+            "POST", f"/app/installations/{installation_id}/access_tokens", jwt, scheme="Bearer"
+        )
+        expires_at = datetime.fromisoformat(data["expires_at"].replace("Z", "+00:00"))
+        return data["token"], expires_at
+
+    async def get_repo_installation(self, owner: str, repo_name: str, jwt: str) -> int:
+        data = await self.request("GET", f"/repos/{owner}/{repo_name}/installation", jwt, scheme="Bearer")
+        return data["id"]
+
+    # Repository endpoints
+
+    async def get_contents(self, full_name: str, path: str, token: str, scope: Hashable = None) -> Optional[str]:
+        """Decoded text of a file on the default branch, None if it does not exist."""
+        try:
+            data = await self.request("GET", f"/repos/{full_name}/contents/{path}", token, scope=scope)
+        except GithubApiError as exc:
+            if exc.status == 404:
+                return None
+            raise
+        if not isinstance(data, dict) or data.get("encoding") != "base64":
+            return None
+        return base64.b64decode(data["content"]).decode()
+
+    async def get_labels(self, full_name: str, token: str, scope: Hashable = None) -> List[dict]:
+        return await self.paginate(f"/repos/{full_name}/labels", token, scope=scope, params={"per_page": 100})
+
+    async def get_issue(self, full_name: str, issue_number: int, token: str, scope: Hashable = None) -> dict:
+        return await self.request("GET", f"/repos/{full_name}/issues/{issue_number}", token, scope=scope)
+
+    async def edit_issue(self, full_name: str, issue_number: int, token: str, **changes: Any) -> dict:
+        return await self.request("PATCH", f"/repos/{full_name}/issues/{issue_number}", token, json=changes)
+
+    async def add_labels(self, full_name: str, issue_number: int, labels: List[str], token: str) -> List[dict]:
+        return await self.request(
+            "POST", f"/repos/{full_name}/issues/{issue_number}/labels", token, json={"labels": labels}
+        )
+
+    async def get_comments(self, full_name: str, issue_number: int, token: str, scope: Hashable = None) -> List[dict]:
+        return await self.paginate(
+            f"/repos/{full_name}/issues/{issue_number}/comments", token, scope=scope, params={"per_page": 100}
+        )
+
+    async def create_comment(self, full_name: str, issue_number: int, body: str, token: str) -> dict:
+        return await self.request(
+            "POST", f"/repos/{full_name}/issues/{issue_number}/comments", token, json={"body": body}
+        )
+
+    async def edit_comment(self, full_name: str, comment_id: int, body: str, token: str) -> dict:
+        return await self.request(
+            "PATCH", f"/repos/{full_name}/issues/comments/{comment_id}", token, json={"body": body}
+        )
+
+    async def get_pull(self, full_name: str, pull_number: int, token: str, scope: Hashable = None) -> dict:
+        return await self.request("GET", f"/repos/{full_name}/pulls/{pull_number}", token, scope=scope)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+            "etag_entries": len(self._etags),
+            "pool_size": self.pool_size,
+        }
+
+    def etag_cache_stats(self) -> dict:
+        """The ETag cache in `cache_registry` terms, a hit is a 304 answered from the cache."""
+        return {
+            "size": len(self._etags),
+            "max_len": self.etag_cache_size,
+            "hits": self.not_modified,
+            "misses": self.revalidated,
+            "evictions": {"size": self.etag_evictions},
+        }
+
+
+github_rest_client = GithubRestClient()
+
+
+async def close_rest_client():
+    """Close the shared connection pool, call on shutdown."""
+    await github_rest_client.close()
+    logger.info("GitHub REST client closed")
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from github import GithubIntegration
+from loguru import logger
+
+from .app_auth import create_app_jwt
+from .rest import github_rest_client
+
+TOKEN_REFRESH_MARGIN = 5 * 60
+"""Refresh a token in the background once it expires within this many seconds"""
+TOKEN_MIN_TTL = 60
+"""Never hand out a token that expires within this many seconds"""
+
+
+class CachedToken(NamedTuple):
+    token: str
+    expires_at: datetime
+
+
+class InstallationTokenCache:
+    """
+    Installation access tokens keyed by installation id.
+
+    Tokens are reused until `expires_at` comes close, then refreshed in a background thread
+    while the current token is still served.
+    """
+
+    def __init__(
+            self,
+            integration: GithubIntegration,
+            refresh_margin: int = TOKEN_REFRESH_MARGIN,
+            min_ttl: int = TOKEN_MIN_TTL,
+    ):
+        """
+        :param integration: GithubIntegration used to exchange tokens
+        :param refresh_margin: Seconds before expiry when a background refresh starts
+        :param min_ttl: Seconds before expiry when a token is no longer served
+        """
+        self.integration = integration
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self.min_ttl = timedelta(seconds=min_ttl)
+        self.hits = 0
+        self.fetches = 0
+        self.background_refreshes = 0
+        self.invalidations = 0
+        self._tokens: Dict[int, CachedToken] = {}
+        self._installation_by_token: Dict[str, int] = {}
+        self._installations: Dict[str, int] = {}
+        self._locks: Dict[int, threading.Lock] = {}
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+        self._async_locks: Dict[int, asyncio.Lock] = {}
+        self.async_fetcher: Optional[Callable[[int], Awaitable[Tuple[str, datetime]]]] = None
+        """Optional coroutine exchanging tokens without a thread, e.g. through the REST client"""
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="token-refresh")
+
+    def _key_lock(self, installation_id: int) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(installation_id, threading.Lock())
+
+    def _store(self, installation_id: int, token: str, expires_at: datetime) -> CachedToken:
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        cached = CachedToken(token=token, expires_at=expires_at)
+        previous = self._tokens.get(installation_id)
+        if previous is not None:
+            self._installation_by_token.pop(previous.token, None)
+        self._tokens[installation_id] = cached
+        self._installation_by_token[token] = installation_id
+        self.fetches += 1
+        logger.debug(f"Installation token refreshed --installation {installation_id} --expires {expires_at}")
+        return cached
+
+    def _fetch(self, installation_id: int) -> CachedToken:
+        authorization = self.integration.get_access_token(installation_id)
+        return self._store(installation_id, authorization.token, authorization.expires_at)
+
+    def _refresh_in_background(self, installation_id: int):
+        def refresh():
+            try:
+                with self._key_lock(installation_id):
+                    self._fetch(installation_id)
+                self.background_refreshes += 1
+            except Exception as exc:
+                logger.error(f"Failed to refresh installation token {installation_id}: {exc}")
+            finally:
+                self._refreshing.discard(installation_id)
+
+        with self._lock:
+            if installation_id in self._refreshing:
+                return
+            self._refreshing.add(installation_id)
+        self._executor.submit(refresh)
+
+    def _lookup(self, installation_id: int) -> Optional[str]:
+        cached = self._tokens.get(installation_id)
+        if cached is None:
+            return None
+        remaining = cached.expires_at - datetime.now(tz=timezone.utc)
+        if remaining <= self.min_ttl:
+            return None
+        if remaining <= self.refresh_margin:
+            self._refresh_in_background(installation_id)
+        self.hits += 1
+        return cached.token
+
+    def get_token(self, installation_id: int) -> str:
+        """
+        Get a valid access token for the installation, blocking only when none is cached.
+        :param installation_id: Installation id
+        :return: str
+        """
+        token = self._lookup(installation_id)
+        if token:
+            return token
+        with self._key_lock(installation_id):
+            token = self._lookup(installation_id)
+            if token:
+                return token
+            return self._fetch(installation_id).token
+
+    async def aget_token(self, installation_id: int) -> str:
+        """
+        Async variant of `get_token`, the token exchange runs through `async_fetcher` or in a worker thread.
+        :param installation_id: Installation id
+        :return: str
+        """
+        token = self._lookup(installation_id)
+        if token:
+            return token
+        if self.async_fetcher is not None:
+            lock = self._async_locks.setdefault(installation_id, asyncio.Lock())
+            async with lock:
+                token = self._lookup(installation_id)
+                if token:
+                    return token
+                return self._store(installation_id, *await self.async_fetcher(installation_id)).token
+        auth = getattr(self.integration, "auth", None)
+        if hasattr(auth, "warm"):
+            await auth.warm()
+        return await asyncio.to_thread(self.get_token, installation_id)
+
+    def get_installation_id(self, owner: str, repo_name: str) -> int:
+        """
+        Resolve the installation of a repository, used when the payload carries no installation.
+        :param owner: Repository owner login
+        :param repo_name: Repository name
+        :return: int
+        """
+        key = f"{owner}/{repo_name}".lower()
+        installation_id = self._installations.get(key)
+        if installation_id is None:
+            installation_id = self.integration.get_repo_installation(owner, repo_name).id
+            self._installations[key] = installation_id
+        return installation_id
+
+    def installation_of(self, token: str) -> Optional[int]:
+        """:return: Installation id of a cached token, None for tokens this cache did not hand out"""
+        return self._installation_by_token.get(token)
+
+    def invalidate(self, installation_id: int, token: Optional[str] = None):
+        """
+        Drop the cached token, e.g. after a 401 or an uninstall.
+        :param token: The rejected token, a newer one cached meanwhile is kept
+        """
+        with self._lock:
+            cached = self._tokens.get(installation_id)
+            if cached is not None and (token is None or cached.token == token):
+                del self._tokens[installation_id]
+                self._installation_by_token.pop(cached.token, None)
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._tokens),
+            "installations": len(self._installations),
+            "hits": self.hits,
+            "fetches": self.fetches,
+            "misses": self.fetches - self.background_refreshes,
+            "loads": self.fetches,
+            "background_refreshes": self.background_refreshes,
+            "invalidations": self.invalidations,
+        }
+
+
+_caches: "weakref.WeakKeyDictionary[GithubIntegration, InstallationTokenCache]" = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+async def _exchange_token(integration: GithubIntegration, installation_id: int) -> Tuple[str, datetime]:
+    jwt = await create_app_jwt(integration.auth)
+    return await github_rest_client.create_installation_token(installation_id, jwt)
+
+
+def get_token_cache(integration: GithubIntegration) -> InstallationTokenCache:
+    """
+    Get the token cache bound to an integration, created on first use.
+    :param integration: GithubIntegration
+    :return: InstallationTokenCache
+    """
+    with _caches_lock:
+        cache = _caches.get(integration)
+        if cache is None:
+            cache = InstallationTokenCache(integration)
+            cache.async_fetcher = functools.partial(_exchange_token, integration)
+            _caches[integration] = cache
+        return cache
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from .repo import RepoClient
+
+ISSUE_WRITE_DEADLINE = 10
+"""Seconds a queued issue change may wait for the other handlers before it is flushed anyway"""
+
+OnWritten = Callable[[], Awaitable[Any]]
+
+
+@dataclass
+class PendingIssueWrite:
+    """Changes queued for one issue, merged in arrival order."""
+    title: Optional[str] = None
+    body: Optional[str] = None
+    labels: List[str] = field(default_factory=list)
+    on_edited: List[OnWritten] = field(default_factory=list)
+    """Called once the title and body reached GitHub"""
+    on_labeled: List[OnWritten] = field(default_factory=list)
+    """Called once the labels reached GitHub"""
+
+    def __bool__(self):
+        return self.title is not None or self.body is not None or bool(self.labels)
+
+
+class IssueWriteBuffer:
+    """
+    Coalesces the issue mutations of one delivery into at most one edit and one label request per issue.
+
+    Handlers queue title, body and label changes instead of writing them, the buffer is flushed
+    once all handlers have finished, or when the deadline passes after the first queued change.
+    Later title or body changes win and go out as one PATCH. Labels are merged and added with
+    the additive labels endpoint, so labels set by others in the meantime are kept. They are not
+    folded into the PATCH, which replaces the whole label set, so a delivery changing both
+    sends two requests.
+    Work that depends on a change, such as recording it as done, goes in its `on_written`
+    callback, which only runs once the change has reached GitHub.
+    """
+
+    def __init__(self, client: RepoClient, deadline: float = ISSUE_WRITE_DEADLINE):
+        """
+        :param client: Client of the repository the issues belong to
+        :param deadline: Seconds after the first queued change before an automatic flush, 0 to only flush explicitly
+        """
+        self.client = client
+        self.deadline = deadline
+        self.queued = 0
+        self.requests = 0
+        self._pending: Dict[int, PendingIssueWrite] = {}
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushing: Optional[asyncio.Task] = None
+
+    def edit_issue(
+            self,
+            issue_number: int,
+            title: Optional[str] = None,
+            body: Optional[str] = None,
+            on_written: Optional[OnWritten] = None,
+    ):
+        """
+        Queue a new title and/or body.
+        :param on_written: Coroutine function called after the update succeeded
+        """
+        pending = self._get_pending(issue_number)
+        if title is not None:
+            pending.title = title
+        if body is not None:
+            pending.body = body
+        if on_written is not None:
+            pending.on_edited.append(on_written)
+
+    def add_labels(self, issue_number: int, *labels: str, on_written: Optional[OnWritten] = None):
+        """
+        Queue labels to add.
+        :param on_written: Coroutine function called after the labels were added
+        """
+        pending = self._get_pending(issue_number)
+        pending.labels.extend(label for label in labels if label not in pending.labels)
+        if on_written is not None:
+            pending.on_labeled.append(on_written)
+
+    def _get_pending(self, issue_number: int) -> PendingIssueWrite:
+        self.queued += 1
+        pending = self._pending.get(issue_number)
+        if pending is None:
+            pending = self._pending[issue_number] = PendingIssueWrite()
+        if self._timer is None and self.deadline > 0:
+            self._timer = asyncio.get_running_loop().call_later(self.deadline, self._flush_on_deadline)
+        return pending
+
+    def _flush_on_deadline(self):
+        self._timer = None
+        if self._pending:
+            logger.debug(f"Issue write deadline of {self.deadline}s passed, flushing")
+            self._flushing = asyncio.ensure_future(self.flush())
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def flush(self):
+        """
+        Send every queued change, one edit and one label request per issue at most.
+        Failed changes are logged and dropped without running their `on_written` callbacks.
+        """
+        async with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, {}
+            for issue_number, changes in pending.items():
+                if not changes:
+                    continue
+                if changes.title is not None or changes.body is not None:
+                    await self._write(
+                        issue_number,
+                        self.client.edit_issue(issue_number, title=changes.title, body=changes.body),
+                        changes.on_edited,
+                    )
+                if changes.labels:
+                    await self._write(
+                        issue_number,
+                        self.client.add_labels(issue_number, *changes.labels),
+                        changes.on_labeled,
+                    )
+
+    async def _write(self, issue_number: int, request: Awaitable[Any], callbacks: List[OnWritten]):
+        self.requests += 1
+        try:
+            await request
+        except Exception as exc:
+            logger.error(f"Failed to update issue {self.client.full_name}#{issue_number}: {exc}")
+            return
+        for callback in callbacks:
+            try:
+                await callback()
+            except Exception as exc:
+                logger.exception(f"Callback after updating issue {self.client.full_name}#{issue_number} failed: {exc}")
+
+    async def close(self):
+        """Flush what is left, waiting for a deadline flush already in progress."""
+        if self._flushing is not None:
+            await asyncio.gather(self._flushing, return_exceptions=True)
+        await self.flush()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Pluggable JSON backend.
+
+Picks orjson or msgspec when installed, they decode straight from raw `bytes`. The stdlib `json`
+fallback decodes the bytes to str first, as `json.loads` is slower on bytes.
+"""
+import json
+from typing import Any, Callable, Dict, Union
+
+JsonInput = Union[bytes, bytearray, memoryview, str]
+
+
+def _stdlib_loads(data: JsonInput) -> Any:
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    if isinstance(data, (bytes, bytearray)):
+        # json.loads on bytes sniffs the encoding and decodes with surrogatepass, which is slower
+        data = data.decode("utf-8")
+    return json.loads(data)
+
+
+def _load_backends() -> Dict[str, Callable[[JsonInput], Any]]:
+    backends = {}
+    try:
+        import orjson
+
+        backends["orjson"] = orjson.loads
+    except ImportError:
+        pass
+    try:
+        import msgspec
+
+        backends["msgspec"] = msgspec.json.Decoder().decode
+    except ImportError:
+        pass
+    backends["json"] = _stdlib_loads
+    return backends
+
+
+BACKENDS = _load_backends()
+BACKEND = next(iter(BACKENDS))
+"""Name of the backend used by `loads`"""
+_loads = BACKENDS[BACKEND]
+
+
+def get_backend(name: str) -> Callable[[JsonInput], Any]:
+    """
+    Get the decode function of an installed backend.
+    :param name: orjson, msgspec or json
+    :raises KeyError: backend is not installed
+    """
+    return BACKENDS[name]
+
+
+def loads(data: JsonInput, encoding: str = "utf-8") -> Any:
+    """
+    Decode a JSON document.
+    :param data: raw bytes or str
+    :param encoding: charset of `data`, only non UTF-8 bytes are decoded to str first
+    """
+    if encoding.lower().replace("-", "") != "utf8" and not isinstance(data, str):
+        data = bytes(data).decode(encoding)
+    return _loads(data)
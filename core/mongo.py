@@ -1,5 +1,6 @@
-from datetime import datetime, timezone
-from typing import List, Optional
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional, Tuple
 
 import pymongo
 from dotenv import load_dotenv
@@ -8,43 +9,21 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from odmantic import AIOEngine
 from odmantic import Field as OdField, Model as OdModel
 from pydantic import Field
-from pydantic import model_validator
 from pydantic_settings import BaseSettings
-from pymongo import MongoClient
-from pymongo.errors import ServerSelectionTimeoutError
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from .cache import SharedCacheBackend, SharedEntry
+from .github_app.http_cache import GITHUB_HTTP_CACHE_SIZE, CachedResponse, HttpCacheBackend
 
 
 class MongoDb(BaseSettings):
     mongodb_dsn: str = Field("mongodb://localhost:27017", validation_alias="MONGODB_DSN")
     """MongoDB 配置"""
-    available: bool = True
-    """MongoDB 连接状态"""
-
-    @model_validator(mode="after")
-    def mongodb_validator(self):
-        try:
-            client = MongoClient(
-                self.mongodb_dsn, serverSelectionTimeoutMS=1000
-            )  # 设置超时时间
-            client.admin.command("ping")
-            # 获取服务器信息
-            client.server_info()
-            # 尝试执行需要管理员权限的命令
-            client.admin.command("listDatabases")
-        except ServerSelectionTimeoutError:
-            self.available = False
-            logger.warning(
-                f"\n🍀MongoDB Connection Error -- timeout when connecting to {self.mongodb_dsn}"
-            )
-        except pymongo.errors.OperationFailure:
-            self.available = False
-            logger.warning("\n🍀MongoDB Connection Error -- insufficient permissions")
-        except Exception as e:
-            self.available = False
-            logger.warning(f"\n🍀MongoDB Connection Error -- error {e}")
-        else:
-            logger.success(f"\n🍀MongoDB Connection Success --dsn {self.mongodb_dsn}")
-        return self
+    max_pool_size: int = Field(100, validation_alias="MONGODB_MAX_POOL_SIZE")
+    min_pool_size: int = Field(0, validation_alias="MONGODB_MIN_POOL_SIZE")
+    server_selection_timeout_ms: int = Field(5000, validation_alias="MONGODB_TIMEOUT_MS")
+    """How long an operation waits for a reachable server"""
 
 
 def utcnow():
@@ -61,14 +40,332 @@ class IssueOperation(OdModel):
     labels: Optional[List[str]] = None
 
 
+class WebhookDelivery(OdModel):
+    delivery_id: str
+    created_at: datetime = OdField(default_factory=utcnow)
+
+    model_config = {"collection": "webhook_delivery"}
+
+
 load_dotenv()
 MongoSetting = MongoDb()
-if not MongoSetting.available:
-    logger.error("MongoDB Connection Error")
-    raise ValueError("MongoDB Connection Error")
 
+# No I/O happens here, the pool connects on the first operation
 global_client = AIOEngine(
-    client=AsyncIOMotorClient(MongoSetting.mongodb_dsn),
+    client=AsyncIOMotorClient(
+        MongoSetting.mongodb_dsn,
+        maxPoolSize=MongoSetting.max_pool_size,
+        minPoolSize=MongoSetting.min_pool_size,
+        serverSelectionTimeoutMS=MongoSetting.server_selection_timeout_ms,
+        connect=False,
+    ),
     database="contributor-app",
 )
-logger.info("Mongodb initialized")
+
+
+async def ping_mongo() -> float:
+    """
+    Round trip of a `ping` command.
+    :return: Latency in seconds
+    :raises PyMongoError: MongoDB is not reachable
+    """
+    started = time.perf_counter()
+    await global_client.client.admin.command("ping")
+    return time.perf_counter() - started
+
+
+async def init_mongo() -> bool:
+    """
+    Check the connection on startup without blocking the event loop.
+    :return: Whether MongoDB answered, failures are logged instead of raised
+    """
+    try:
+        latency = await ping_mongo()
+    except PyMongoError as e:
+        logger.warning(f"\n🍀MongoDB Connection Error -- {e}")
+        return False
+    logger.success(f"\n🍀MongoDB Connection Success --latency {latency * 1000:.1f}ms")
+    return True
+
+
+async def ensure_delivery_indexes(window_seconds: int):
+    """
+    Create the unique and TTL indexes backing webhook delivery deduplication.
+    :param window_seconds: How long a delivery id is remembered
+    """
+    collection = global_client.get_collection(WebhookDelivery)
+    await collection.create_index("delivery_id", unique=True)
+    await collection.create_index("created_at", expireAfterSeconds=window_seconds)
+
+
+async def claim_delivery(delivery_id: str) -> bool:
+    """
+    Record a webhook delivery id.
+    :param delivery_id: X-GitHub-Delivery header value
+    :return: True if the delivery id was not recorded before
+    """
+    collection = global_client.get_collection(WebhookDelivery)
+    result = await collection.update_one(
+        {"delivery_id": delivery_id},
+        {"$setOnInsert": {"delivery_id": delivery_id, "created_at": utcnow()}},
+        upsert=True,
+    )
+    return result.upserted_id is not None
+
+
+async def release_delivery(delivery_id: str):
+    """
+    Forget a webhook delivery id recorded by `claim_delivery`.
+    :param delivery_id: X-GitHub-Delivery header value
+    """
+    collection = global_client.get_collection(WebhookDelivery)
+    await collection.delete_one({"delivery_id": delivery_id})
+
+
+async def ensure_operation_indexes():
+    """
+    Create the unique `(repo_name, issue_id)` index backing `upsert_operation`.
+    Existing duplicate records must be merged by hand before the index can be built.
+    """
+    collection = global_client.get_collection(IssueOperation)
+    try:
+        await collection.create_index(
+            [("repo_name", pymongo.ASCENDING), ("issue_id", pymongo.ASCENDING)],
+            unique=True,
+        )
+    except pymongo.errors.OperationFailure as e:
+        logger.error(f"Failed to create issue operation index: {e}")
+
+
+async def upsert_operation(repo_name: str, issue_id: int, **changes: Any) -> IssueOperation:
+    """
+    Atomically get the operation record of an issue, creating it if missing.
+    Only the given fields are written, fields set by concurrent handlers are kept.
+    :param repo_name: owner/name of the repository
+    :param issue_id: Issue id
+    :param changes: IssueOperation fields to `$set`
+    :return: The record after the update
+    """
+    collection = global_client.get_collection(IssueOperation)
+    update = {"$setOnInsert": {"repo_name": repo_name, "issue_id": issue_id}}
+    if changes:
+        update["$set"] = changes
+    query = {"repo_name": repo_name, "issue_id": issue_id}
+    try:
+        doc = await collection.find_one_and_update(
+            query, update, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Lost an insert race with another handler, the record exists now
+        doc = await collection.find_one_and_update(query, update, return_document=ReturnDocument.AFTER)
+    return IssueOperation.model_validate_doc(doc)
+
+
+async def bulk_update_operations(batch: List[Tuple[Tuple[str, int], dict]]):
+    """
+    Upsert a batch of operation field updates in one unordered `bulk_write`.
+    :param batch: ((repo_name, issue_id), changes) pairs
+    """
+    collection = global_client.get_collection(IssueOperation)
+    await collection.bulk_write(
+        [
+            UpdateOne(
+                {"repo_name": repo_name, "issue_id": issue_id},
+                {"$setOnInsert": {"repo_name": repo_name, "issue_id": issue_id}, "$set": changes},
+                upsert=True,
+            )
+            for (repo_name, issue_id), changes in batch
+        ],
+        ordered=False,
+    )
+
+
+class MongoSharedCache(SharedCacheBackend):
+    """
+    L2 cache in the `shared_cache` collection of the shared Motor client.
+    An invalidation leaves a tombstone carrying the bumped version, and expired values keep
+    their document too, so a load that started before either cannot write over it. Documents
+    are removed by a TTL index on `purge_at`, `tombstone_ttl` seconds after they stop being
+    live, see `ensure_shared_cache_indexes`.
+    """
+
+    collection_name = "shared_cache"
+    tombstone_ttl = 60 * 60
+    """Seconds a dead document keeps its version, far longer than any load"""
+
+    @property
+    def collection(self):
+        return global_client.database[self.collection_name]
+
+    async def get(self, namespace: str, key: str) -> Optional[SharedEntry]:
+        doc = await self.collection.find_one({"_id": f"{namespace}:{key}"})
+        if doc is None:
+            return None
+        # The client is not timezone aware, stored datetimes come back naive in UTC
+        live = doc.get("live", False) and doc["expires_at"].replace(tzinfo=timezone.utc) > utcnow()
+        return SharedEntry(value=doc.get("value"), version=doc["version"], live=live)
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float, expected_version: int) -> Optional[int]:
+        expires_at = utcnow() + timedelta(seconds=ttl)
+        try:
+            # A moved version does not match, the upsert then collides with the existing _id
+            doc = await self.collection.find_one_and_update(
+                {"_id": f"{namespace}:{key}", "version": expected_version},
+                {
+                    "$set": {
+                        "namespace": namespace,
+                        "key": key,
+                        "value": value,
+                        "live": True,
+                        "expires_at": expires_at,
+                        "purge_at": expires_at + timedelta(seconds=self.tombstone_ttl),
+                    },
+                    "$inc": {"version": 1},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+                projection={"version": True},
+            )
+        except DuplicateKeyError:
+            return None
+        return doc["version"]
+
+    async def invalidate(self, namespace: str, key: str) -> int:
+        now = utcnow()
+        update = {
+            "$set": {
+                "namespace": namespace,
+                "key": key,
+                "live": False,
+                "expires_at": now,
+                "purge_at": now + timedelta(seconds=self.tombstone_ttl),
+            },
+            "$unset": {"value": ""},
+            "$inc": {"version": 1},
+        }
+        for attempt in range(2):
+            try:
+                # Unknown keys get a tombstone too, a load that saw no document must not write
+                doc = await self.collection.find_one_and_update(
+                    {"_id": f"{namespace}:{key}"},
+                    update,
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER,
+                    projection={"version": True},
+                )
+                return doc["version"]
+            except DuplicateKeyError:
+                # A concurrent upsert created the document first, the retry updates it
+                if attempt:
+                    raise
+
+
+async def ensure_shared_cache_indexes():
+    """Create the TTL index purging dead `MongoSharedCache` documents."""
+    collection = global_client.database[MongoSharedCache.collection_name]
+    if "expires_at_1" in await collection.index_information():
+        # Expiring on `expires_at` dropped tombstones right away and reset their version
+        await collection.drop_index("expires_at_1")
+    await collection.create_index("purge_at", expireAfterSeconds=0)
+
+
+class MongoHttpCache(HttpCacheBackend):
+    """
+    GitHub HTTP cache in the `github_http_cache` collection, shared by every worker and node.
+    PyGithub runs in worker threads, so this backend uses its own synchronous client.
+    Above `max_bytes`, the oldest stored responses are dropped, checked on the first write and
+    every `trim_every` writes. The size and bytes in stats are counted at each check and follow
+    the writes of this process in between, so reading them does no I/O.
+    """
+
+    name = "mongo"
+    collection_name = "github_http_cache"
+    ttl = 60 * 60 * 24 * 7
+    """Seconds a response is kept without being stored again"""
+
+    def __init__(self, max_bytes: int = GITHUB_HTTP_CACHE_SIZE, trim_every: int = 100):
+        super().__init__(max_bytes)
+        self.trim_every = trim_every
+        self._writes = 0
+        self._count: Optional[int] = None
+        self._bytes: Optional[int] = None
+        self._client: Optional[pymongo.MongoClient] = None
+
+    @property
+    def collection(self):
+        if self._client is None:
+            self._client = pymongo.MongoClient(
+                MongoSetting.mongodb_dsn,
+                serverSelectionTimeoutMS=MongoSetting.server_selection_timeout_ms,
+                connect=False,
+            )
+        return self._client[global_client.database.name][self.collection_name]
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        doc = self.collection.find_one({"_id": key})
+        if doc is None:
+            return None
+        return CachedResponse(
+            etag=doc["etag"],
+            status=doc["status"],
+            headers=doc["headers"],
+            body=bytes(doc["body"]),
+            stored_at=doc["stored_at"].timestamp(),
+        )
+
+    def set(self, key: str, response: CachedResponse):
+        result = self.collection.replace_one(
+            {"_id": key},
+            {
+                "etag": response.etag,
+                "status": response.status,
+                "headers": response.headers,
+                "body": response.body,
+                "size": response.size,
+                "stored_at": datetime.fromtimestamp(response.stored_at, tz=timezone.utc),
+            },
+            upsert=True,
+        )
+        if result.upserted_id is not None and self._count is not None:
+            # A replaced response keeps its old size until the next trim recounts the bytes
+            self._count += 1
+            self._bytes += response.size
+        self._writes += 1
+        # The first write also counts what other workers and runs stored
+        if self._count is None or self._writes % self.trim_every == 0:
+            self._trim()
+
+    def _trim(self):
+        total = next(
+            self.collection.aggregate(
+                [{"$group": {"_id": None, "bytes": {"$sum": "$size"}, "count": {"$sum": 1}}}]
+            ),
+            None,
+        )
+        self._count = total["count"] if total else 0
+        self._bytes = total["bytes"] if total else 0
+        excess = self._bytes - self.max_bytes
+        if excess <= 0:
+            return
+        victims = []
+        for doc in self.collection.find({}, {"size": True}).sort("stored_at", pymongo.ASCENDING):
+            victims.append(doc["_id"])
+            excess -= doc["size"]
+            if excess <= 0:
+                break
+        deleted = self.collection.delete_many({"_id": {"$in": victims}}).deleted_count
+        self.evictions += deleted
+        self._count -= deleted
+        self._bytes = self.max_bytes + excess
+
+    def size(self) -> Optional[int]:
+        return self._count
+
+    def stored_bytes(self) -> Optional[int]:
+        return self._bytes
+
+
+async def ensure_http_cache_indexes():
+    """Create the TTL index of `MongoHttpCache`, also used to find the oldest responses."""
+    collection = global_client.database[MongoHttpCache.collection_name]
+    await collection.create_index("stored_at", expireAfterSeconds=MongoHttpCache.ttl)
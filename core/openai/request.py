@@ -8,6 +8,7 @@ from pydantic import ConfigDict, BaseModel, Field, field_validator, model_valida
 from pydantic import SecretStr
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from .. import jsonlib
 from ._excption import raise_error, NetworkError, UnexpectedFormatError
 from .cell import (
     Tool,
@@ -209,7 +210,7 @@ class OpenAI(BaseModel):
             logger.exception(f"Request Error: {exc}")
             raise NetworkError("Some error occurred while making request.")
         try:
-            jsoned = response.json()
+            jsoned = jsonlib.loads(response.content)
         except Exception as exc:
             logger.exception(f"Server send a invalid response. \n{exc}")
             raise NetworkError("Server send a invalid response cant be parsed.")
@@ -1,8 +1,6 @@
 from io import BytesIO
 from typing import Literal
 
-from PIL import Image
-
 
 def resize_openai_image(
     image_bytes: bytes, mode: Literal["low", "high", "auto"] = "auto"
@@ -14,6 +12,9 @@ def resize_openai_image(
     :param mode: 模式
     :return: 处理后的图片二进制数据
     """
+    # Pillow is only needed for image messages, keep it off the import path
+    from PIL import Image
+
     # 将 bytes 转换为图片对象
     image = Image.open(BytesIO(image_bytes))
     # 获取图片的尺寸
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+from dotenv import load_dotenv
+from loguru import logger
+from pydantic import Field
+from pydantic_settings import BaseSettings
+
+from . import jsonlib
+from .mongo import (
+    IssueOperation,
+    bulk_update_operations,
+    ensure_operation_indexes,
+    init_mongo,
+    ping_mongo,
+    upsert_operation,
+)
+from .write_behind import WriteBehindBuffer
+
+OperationKey = Tuple[str, int]
+"""(repo_name, issue_id)"""
+OperationBackend = Literal["mongo", "sqlite"]
+
+
+class OperationStoreSetting(BaseSettings):
+    operation_store: OperationBackend = Field("mongo", validation_alias="OPERATION_STORE")
+    """Where issue operation records are kept"""
+    operation_store_path: str = Field("operations.sqlite", validation_alias="OPERATION_STORE_PATH")
+    """SQLite database file of the sqlite store, :memory: to keep records in process"""
+    operation_write_behind: bool = Field(True, validation_alias="OPERATION_WRITE_BEHIND")
+    """Buffer issue operation updates and write them in batches"""
+    operation_write_batch: int = Field(100, validation_alias="OPERATION_WRITE_BATCH")
+    operation_flush_interval: float = Field(1.0, validation_alias="OPERATION_FLUSH_INTERVAL")
+    operation_buffer_size: int = Field(10000, validation_alias="OPERATION_BUFFER_SIZE")
+
+
+class OperationStore(ABC):
+    """
+    Storage of `IssueOperation` records, one per (repo_name, issue_id).
+    Writes are field-level upserts, fields set by concurrent handlers are kept.
+    """
+
+    name: str
+
+    async def prepare(self) -> bool:
+        """
+        Connect and create what the store needs, called once on startup.
+        :return: Whether the store is usable
+        """
+        return True
+
+    @abstractmethod
+    async def upsert(self, repo_name: str, issue_id: int, **changes: Any) -> IssueOperation:
+        """
+        Get the record of an issue, creating it if missing, after setting the given fields.
+        :param repo_name: owner/name of the repository
+        :param issue_id: Issue id
+        :param changes: IssueOperation fields to set
+        """
+
+    @abstractmethod
+    async def bulk_update(self, batch: List[Tuple[OperationKey, Dict[str, Any]]]):
+        """Upsert a batch of field updates in one round trip."""
+
+    @abstractmethod
+    async def ping(self) -> float:
+        """
+        :return: Latency of a trivial request in seconds
+        """
+
+    async def close(self):
+        """Release connections, called on shutdown."""
+
+
+class MongoOperationStore(OperationStore):
+    """Records in the `issue_operation` collection of the shared Motor client."""
+
+    name = "mongo"
+
+    async def prepare(self) -> bool:
+        if not await init_mongo():
+            return False
+        await ensure_operation_indexes()
+        return True
+
+    async def upsert(self, repo_name: str, issue_id: int, **changes: Any) -> IssueOperation:
+        return await upsert_operation(repo_name, issue_id, **changes)
+
+    async def bulk_update(self, batch: List[Tuple[OperationKey, Dict[str, Any]]]):
+        await bulk_update_operations(batch)
+
+    async def ping(self) -> float:
+        return await ping_mongo()
+
+
+class SqliteOperationStore(OperationStore):
+    """
+    Embedded store for single-node installs and benchmarks, no network hop per lookup.
+    Records are JSON documents keyed by (repo_name, issue_id), `:memory:` keeps them in process.
+    Statements run on a worker thread, serialized by a lock.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str = ":memory:"):
+        """
+        :param path: SQLite database file, or :memory:
+        """
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS issue_operation ("
+                " repo_name TEXT NOT NULL,"
+                " issue_id INTEGER NOT NULL,"
+                " doc TEXT NOT NULL,"
+                " PRIMARY KEY (repo_name, issue_id))"
+            )
+        return self._conn
+
+    def _upsert(self, conn: sqlite3.Connection, repo_name: str, issue_id: int, changes: Dict[str, Any]) -> dict:
+        row = conn.execute(
+            "SELECT doc FROM issue_operation WHERE repo_name = ? AND issue_id = ?", (repo_name, issue_id)
+        ).fetchone()
+        if row:
+            doc = jsonlib.loads(row[0])
+        else:
+            doc = IssueOperation(repo_name=repo_name, issue_id=issue_id).model_dump(mode="json")
+        if changes or not row:
+            doc.update(changes)
+            conn.execute(
+                "INSERT INTO issue_operation (repo_name, issue_id, doc) VALUES (?, ?, ?)"
+                " ON CONFLICT (repo_name, issue_id) DO UPDATE SET doc = excluded.doc",
+                (repo_name, issue_id, json.dumps(doc)),
+            )
+        return doc
+
+    def _run_upsert(self, repo_name: str, issue_id: int, changes: Dict[str, Any]) -> dict:
+        with self._lock:
+            return self._upsert(self._connect(), repo_name, issue_id, changes)
+
+    def _run_bulk_update(self, batch: List[Tuple[OperationKey, Dict[str, Any]]]):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                for (repo_name, issue_id), changes in batch:
+                    self._upsert(conn, repo_name, issue_id, changes)
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _run_connect(self):
+        with self._lock:
+            self._connect()
+
+    async def prepare(self) -> bool:
+        await asyncio.to_thread(self._run_connect)
+        if self.path == ":memory:":
+            logger.warning("Operation store is in memory, issue operation records are lost on restart")
+        logger.success(f"Operation store ready --sqlite {self.path}")
+        return True
+
+    async def upsert(self, repo_name: str, issue_id: int, **changes: Any) -> IssueOperation:
+        doc = await asyncio.to_thread(self._run_upsert, repo_name, issue_id, changes)
+        return IssueOperation.model_validate(doc)
+
+    async def bulk_update(self, batch: List[Tuple[OperationKey, Dict[str, Any]]]):
+        await asyncio.to_thread(self._run_bulk_update, batch)
+
+    def _run_ping(self):
+        with self._lock:
+            self._connect().execute("SELECT 1").fetchone()
+
+    async def ping(self) -> float:
+        started = time.perf_counter()
+        await asyncio.to_thread(self._run_ping)
+        return time.perf_counter() - started
+
+    async def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def create_operation_store(backend: OperationBackend, path: str = ":memory:") -> OperationStore:
+    """
+    :param backend: mongo or sqlite
+    :param path: Database file of the sqlite store
+    """
+    if backend == "sqlite":
+        return SqliteOperationStore(path)
+    if backend == "mongo":
+        return MongoOperationStore()
+    raise ValueError(f"Unknown operation store: {backend}")
+
+
+load_dotenv()
+OperationSetting = OperationStoreSetting()
+_operation_store: OperationStore = create_operation_store(
+    OperationSetting.operation_store, OperationSetting.operation_store_path
+)
+
+
+def get_operation_store() -> OperationStore:
+    return _operation_store
+
+
+def set_operation_store(store: OperationStore):
+    """Replace the store used by `get_operation` and `update_operation`."""
+    global _operation_store
+    _operation_store = store
+
+
+async def _write_batch(batch: List[Tuple[OperationKey, Dict[str, Any]]]):
+    await _operation_store.bulk_update(batch)
+
+
+operation_writer = WriteBehindBuffer(
+    writer=_write_batch,
+    max_batch=OperationSetting.operation_write_batch,
+    flush_interval=OperationSetting.operation_flush_interval,
+    max_pending=OperationSetting.operation_buffer_size,
+)
+"""Write-behind buffer of `update_operation`, started in the application lifespan"""
+
+
+async def get_operation(repo_name: str, issue_id: int) -> IssueOperation:
+    """
+    Get the operation record of an issue, creating it if missing.
+    Updates still waiting in the write-behind buffer are applied over the stored record.
+    """
+    operation = await _operation_store.upsert(repo_name, issue_id)
+    for key, value in operation_writer.pending_changes((repo_name, issue_id)).items():
+        setattr(operation, key, value)
+    return operation
+
+
+async def update_operation(operation: IssueOperation, **changes: Any) -> IssueOperation:
+    """
+    Set fields of an operation record, in memory and in the store.
+    :param operation: Record returned by `get_operation`
+    :param changes: IssueOperation fields to set
+    :return: The record after the update
+    """
+    for key, value in changes.items():
+        setattr(operation, key, value)
+    if operation_writer.running:
+        await operation_writer.put((operation.repo_name, operation.issue_id), changes)
+        return operation
+    return await _operation_store.upsert(operation.repo_name, operation.issue_id, **changes)
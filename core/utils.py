@@ -1,20 +1,47 @@
 from typing import Optional
 
-import toml
-from github.Repository import Repository
 from loguru import logger
 from pydantic import BaseModel, model_validator
 
-from .cache import ExpiringDict
+from .cache import AsyncCache, FrequencySketch, cached
+from .github_app import RepoClient
 
-setting_cache = ExpiringDict(max_len=100, max_age_seconds=60 * 60 * 1)  # 1hours
+try:
+    from tomllib import TOMLDecodeError, loads as toml_loads
+except ImportError:  # Python < 3.11
+    from toml import TomlDecodeError as TOMLDecodeError, loads as toml_loads
+
+REPO_SETTING_FILE = ".nerve.toml"
+SETTING_CACHE_TTL = 60 * 60
+"""Seconds a repository setting is kept when nothing invalidates it on change"""
+SETTING_CACHE_PUSH_TTL = 60 * 60 * 24 * 7
+"""Seconds a setting is kept in the shared cache when push events invalidate it on change"""
+SETTING_CACHE_LOCAL_TTL = 60 * 10
+"""In-process TTL when the cache is shared, workers that did not receive the push see it through the L2"""
+
+SETTING_CACHE_BYTES = 1024 * 1024
+"""Memory budget of cached repository settings, custom prompts make entries vary widely in size"""
+
+setting_cache = AsyncCache(
+    ttl=SETTING_CACHE_TTL,
+    stale_ttl=60 * 10,
+    negative_ttl=SETTING_CACHE_TTL,
+    max_len=10000,
+    max_bytes=SETTING_CACHE_BYTES,
+    admission=FrequencySketch(width=4096),
+    namespace="repo_setting",
+    name="repo_setting",
+    encode=lambda setting: setting.model_dump(mode="json"),
+    decode=lambda data: RepoSetting.model_validate(data),
+)
+"""`.nerve.toml` per repository, None when the repository has no config file"""
 
 
 def load_toml_string(toml_str):
     try:
-        toml_dict = toml.loads(toml_str)
+        toml_dict = toml_loads(toml_str)
         return toml_dict
-    except toml.TomlDecodeError as e:
+    except TOMLDecodeError as e:
         print(f"Error decoding TOML: {e}")
         return None
 
@@ -31,24 +58,33 @@ class RepoSetting(BaseModel):
     issue_title_format_prompt: Optional[str] = None
     issue_body_format_prompt: Optional[str] = None
     issue_close_with_report: bool = False
+    issue_triage: bool = False
+    """Run label, title and body formatting as one combined request"""
+
+
+@cached(setting_cache, key=lambda repo_name, client: repo_name)
+async def fetch_repo_setting(repo_name: str, client: RepoClient) -> Optional[RepoSetting]:
+    """
+    Fetch and parse `.nerve.toml` of a repository.
+    :return: RepoSetting, None if the file is missing or invalid
+    :raises Exception: The file could not be fetched
+    """
+    repo_setting_file = await client.get_file(REPO_SETTING_FILE)
+    if not repo_setting_file:
+        return None
+    repo_setting_string = load_toml_string(repo_setting_file)
+    if not repo_setting_string:
+        return None
+    return RepoSetting.model_validate(repo_setting_string)
 
 
-def get_repo_setting(repo_name: str, repo: Repository) -> RepoSetting:
-    repo_setting = setting_cache.get(repo_name)
-    if repo_setting:
-        return repo_setting
-    repo_setting = RepoSetting()
+async def get_repo_setting(repo_name: str, client: RepoClient) -> RepoSetting:
     try:
-        repo_setting_file = repo.get_contents(".nerve.toml")
+        repo_setting = await fetch_repo_setting(repo_name, client)
     except Exception as e:
         logger.error(f"Failed to get repo setting file: {e}")
-    else:
-        if repo_setting_file:
-            repo_setting_string = load_toml_string(repo_setting_file.decoded_content.decode())
-            if repo_setting_string:
-                repo_setting = RepoSetting.model_validate(repo_setting_string)
-    setting_cache.set(repo_name, repo_setting)
-    return repo_setting
+        return RepoSetting()
+    return repo_setting or RepoSetting()
 
 
 class Card(BaseModel):
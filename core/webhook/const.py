@@ -1,2 +1,2 @@
-GITHUB_CACHE_EXPIRE = 360
-GITHUB_CACHE = True
+DELIVERY_DEDUP_WINDOW = 60 * 60 * 24 * 3  # GitHub allows redelivery for 3 days
+DELIVERY_DEDUP_MAX_LEN = 10000
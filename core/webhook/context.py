@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class EventContext:
+    """
+    Per-delivery scratch space shared by every handler of one delivery.
+
+    `memo` runs a loader at most once per key: concurrent handlers asking for the same key
+    await the one in-flight fetch instead of issuing their own.
+    """
+
+    def __init__(self, model: BaseModel):
+        """
+        :param model: The validated event model of the delivery, shared read-only
+        """
+        self.model = model
+        self.hits = 0
+        self.loads = 0
+        self._tasks: Dict[Hashable, asyncio.Future] = {}
+
+    async def memo(self, key: Hashable, loader: Callable[[], Awaitable[T]]) -> T:
+        """
+        Get the value of `key`, calling `loader` only for the first caller of the delivery.
+        Errors are memoized too, every waiter sees the same exception.
+        :param key: Cache key inside the delivery
+        :param loader: Coroutine function producing the value
+        """
+        task = self._tasks.get(key)
+        if task is None:
+            self.loads += 1
+            task = self._tasks[key] = asyncio.ensure_future(loader())
+        else:
+            self.hits += 1
+        # A cancelled waiter must not cancel the fetch the other handlers are waiting for
+        return await asyncio.shield(task)
+
+    async def enabled(self, feature_flag: str) -> bool:
+        """
+        Whether a feature flag declared by a listener is enabled for this delivery.
+        Subclasses resolve flags from their settings, the base context enables everything.
+        :param feature_flag: Flag name passed to `register_listener`
+        """
+        return True
+
+    async def close(self):
+        """
+        Called once after every handler of the delivery has finished.
+        Subclasses flush work deferred by the handlers here.
+        """
+
+    def forget(self, key: Hashable):
+        """Drop a memoized value, the next `memo` call loads it again."""
+        self._tasks.pop(key, None)
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Get a memoized value if it is already loaded, without waiting."""
+        task = self._tasks.get(key)
+        if task is None or not task.done() or task.cancelled() or task.exception():
+            return default
+        return task.result()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+
+from .const import DELIVERY_DEDUP_MAX_LEN, DELIVERY_DEDUP_WINDOW
+
+
+class DeliveryDeduplicator:
+    """
+    Bounded, time-windowed index of webhook delivery ids.
+
+    Lookups hit the in-memory index first and fall back to an optional persistent
+    `backend`, so redeliveries are rejected across restarts.
+    """
+
+    def __init__(
+            self,
+            max_len: int = DELIVERY_DEDUP_MAX_LEN,
+            window_seconds: int = DELIVERY_DEDUP_WINDOW,
+            backend: Optional[Callable[[str], Awaitable[bool]]] = None,
+            release_backend: Optional[Callable[[str], Awaitable[None]]] = None,
+    ):
+        """
+        :param max_len: Maximum number of delivery ids kept in memory.
+        :param window_seconds: How long a delivery id is remembered.
+        :param backend: Coroutine function that records a delivery id and returns True if it was not seen before.
+        :param release_backend: Coroutine function that forgets a delivery id recorded by `backend`.
+        """
+        self.max_len = max_len
+        self.window_seconds = window_seconds
+        self.backend = backend
+        self.release_backend = release_backend
+        self.memory_hits = 0
+        self.backend_hits = 0
+        self.misses = 0
+        self.evictions = {"ttl": 0, "size": 0}
+        self.data: OrderedDict[str, float] = OrderedDict()
+
+    def _expire(self, now: float):
+        while self.data:
+            _, timestamp = next(iter(self.data.items()))
+            if now - timestamp <= self.window_seconds:
+                break
+            self.data.popitem(last=False)
+            self.evictions["ttl"] += 1
+
+    def _remember(self, delivery_id: str, now: float):
+        self.data[delivery_id] = now
+        while len(self.data) > self.max_len:
+            self.data.popitem(last=False)
+            self.evictions["size"] += 1
+
+    async def seen(self, delivery_id: str) -> bool:
+        """
+        Record a delivery id and tell whether it was already processed inside the window.
+        :param delivery_id: X-GitHub-Delivery header value
+        :return: True if the delivery is a duplicate
+        """
+        now = time.time()
+        self._expire(now)
+        if delivery_id in self.data:
+            self.memory_hits += 1
+            return True
+        # Claim in memory first so concurrent duplicates do not both reach the backend
+        self._remember(delivery_id, now)
+        if self.backend is not None:
+            try:
+                first_seen = await self.backend(delivery_id)
+            except Exception as exc:
+                logger.error(f"Delivery dedup backend failed, accepting {delivery_id}: {exc}")
+                first_seen = True
+            if not first_seen:
+                self.backend_hits += 1
+                return True
+        self.misses += 1
+        return False
+
+    async def release(self, delivery_id: str):
+        """
+        Forget a delivery id that could not be processed, so a redelivery is accepted.
+        :param delivery_id: X-GitHub-Delivery header value
+        """
+        self.data.pop(delivery_id, None)
+        if self.release_backend is not None:
+            try:
+                await self.release_backend(delivery_id)
+            except Exception as exc:
+                logger.error(f"Delivery dedup backend failed to release {delivery_id}: {exc}")
+
+    def __len__(self):
+        return len(self.data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.data),
+            "max_len": self.max_len,
+            "window_seconds": self.window_seconds,
+            "hits": self.memory_hits + self.backend_hits,
+            "memory_hits": self.memory_hits,
+            "backend_hits": self.backend_hits,
+            "misses": self.misses,
+            "evictions": dict(self.evictions),
+        }
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import inspect
+from types import MappingProxyType
+from typing import Any, Callable, Dict, FrozenSet, Mapping, NamedTuple, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from .event_type import EVENT_MODEL
+
+
+class Route(NamedTuple):
+    """A registered listener with everything dispatch needs already resolved."""
+    unique_id: str
+    priority: int
+    handler: Callable
+    desc: str
+    filter_func: Optional[Callable[[dict], bool]]
+    config: Any
+    pass_context: bool
+    feature_flag: Optional[str]
+
+
+def accepts_context(handler: Callable) -> bool:
+    """Whether the handler takes the per-delivery `EventContext` as second positional argument."""
+    try:
+        parameters = inspect.signature(handler).parameters.values()
+    except (TypeError, ValueError):
+        return False
+    positional = 0
+    for parameter in parameters:
+        if parameter.kind == parameter.VAR_POSITIONAL:
+            return True
+        if parameter.kind in (parameter.POSITIONAL_ONLY, parameter.POSITIONAL_OR_KEYWORD):
+            positional += 1
+    return positional >= 2
+
+
+class CompiledRoute(NamedTuple):
+    """All listeners of one (event, action) pair, grouped into ordered priority tiers."""
+    model_class: Optional[Type[BaseModel]]
+    tiers: Tuple[Tuple[Route, ...], ...]
+
+
+class DispatchTable:
+    """
+    Immutable routing table compiled from the listener registry.
+    A new table is compiled on every registration, dispatch is a single dict lookup.
+    """
+
+    def __init__(self, routes: Mapping[Tuple[str, str], CompiledRoute]):
+        self._routes = MappingProxyType(dict(routes))
+        subscriptions: Dict[str, set] = {}
+        for event_type, action in self._routes.keys():
+            subscriptions.setdefault(event_type, set()).add(action)
+        self._subscriptions: Mapping[str, FrozenSet[str]] = MappingProxyType(
+            {event_type: frozenset(actions) for event_type, actions in subscriptions.items()}
+        )
+
+    @classmethod
+    def compile(cls, handlers: Dict[str, Dict[str, Dict[int, Dict[str, Any]]]]) -> "DispatchTable":
+        """
+        Compile the nested `handlers[event][action][priority][unique_id]` registry.
+        :param handlers: Listener registry of `GithubWebhookHandler`
+        :return: DispatchTable
+        """
+        routes = {}
+        for event_type, actions in handlers.items():
+            for action, priorities in actions.items():
+                tiers = tuple(
+                    tuple(
+                        Route(
+                            unique_id=unique_id,
+                            priority=priority,
+                            handler=handler_obj.handler,
+                            desc=handler_obj.desc,
+                            filter_func=handler_obj.filter_func,
+                            config=handler_obj.config,
+                            pass_context=accepts_context(handler_obj.handler),
+                            feature_flag=handler_obj.feature_flag,
+                        )
+                        for unique_id, handler_obj in priorities[priority].items()
+                    )
+                    for priority in sorted(priorities.keys())
+                    if priorities[priority]
+                )
+                if tiers:
+                    routes[(event_type, action)] = CompiledRoute(
+                        model_class=EVENT_MODEL.get((event_type, action)),
+                        tiers=tiers,
+                    )
+        return cls(routes)
+
+    def lookup(self, event_type: str, action: str) -> Optional[CompiledRoute]:
+        return self._routes.get((event_type, action))
+
+    def accepts(self, event_type: str, action: Optional[str] = None) -> bool:
+        """
+        Whether any listener is subscribed to the event, checked before the payload is decoded.
+        :param event_type: X-GitHub-Event header value
+        :param action: Action when it is already known, None to check the event only
+        """
+        actions = self._subscriptions.get(event_type)
+        if actions is None:
+            return False
+        return action is None or action in actions
+
+    @property
+    def subscriptions(self) -> Mapping[str, FrozenSet[str]]:
+        return self._subscriptions
+
+    def __len__(self):
+        return len(self._routes)
+
+    def __contains__(self, key: Tuple[str, str]):
+        return key in self._routes
+
+    def snapshot(self) -> dict:
+        """
+        A JSON-friendly view of the table, keyed by `event.action`.
+        """
+        return {
+            f"{event_type}.{action}": {
+                "model": route.model_class.__name__ if route.model_class else None,
+                "tiers": [
+                    [
+                        {
+                            "unique_id": item.unique_id,
+                            "priority": item.priority,
+                            "desc": item.desc,
+                            "handler": getattr(item.handler, "__qualname__", repr(item.handler)),
+                            "filtered": item.filter_func is not None,
+                            "escape_bot": getattr(item.config, "escape_bot", None),
+                            "pass_context": item.pass_context,
+                            "feature_flag": item.feature_flag,
+                        }
+                        for item in tier
+                    ]
+                    for tier in route.tiers
+                ],
+            }
+            for (event_type, action), route in self._routes.items()
+        }
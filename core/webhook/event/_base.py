@@ -9,6 +9,8 @@ from github.Issue import Issue as GithubIssue
 from github.Repository import Repository as GithubRepository
 from pydantic import BaseModel
 
+from ...github_app import RepoClient, create_repo_client, get_token_cache
+
 
 class Organization(BaseModel):
     login: str
@@ -119,47 +121,59 @@ class Repository(BaseModel):
     allow_forking: bool
     is_template: bool
 
-    def _get_repo_access_token(self, integration: GithubIntegration):
+    def _get_repo_access_token(self, integration: GithubIntegration, installation_id: Optional[int] = None):
         """
         Get the access token for the repository.
         :param integration: GithubIntegration
+        :param installation_id: Installation id from the payload, looked up by owner and name when missing
         :return: str
         """
-        return integration.get_access_token(integration.get_repo_installation(self.owner.login, self.name).id).token
+        token_cache = get_token_cache(integration)
+        if installation_id is None:
+            installation_id = token_cache.get_installation_id(self.owner.login, self.name)
+        return token_cache.get_token(installation_id)
 
-    def get_context(self, integration: GithubIntegration) -> Github:
+    def get_context(self, integration: GithubIntegration, installation_id: Optional[int] = None) -> Github:
         """
         Get the context for the repository.
         :param integration: GithubIntegration
+        :param installation_id: Installation id from the payload
         :return: GitHub
         """
-        return Github(login_or_token=self._get_repo_access_token(integration))
+        return Github(login_or_token=self._get_repo_access_token(integration, installation_id))
 
-    def get_repo(self, integration: GithubIntegration) -> GithubRepository:
+    def get_repo(self, integration: GithubIntegration, installation_id: Optional[int] = None) -> GithubRepository:
         """
         Get the repository object.
         :param integration: GithubIntegration
+        :param installation_id: Installation id from the payload
         :return: Repository
         """
-        return self.get_context(integration).get_repo(f"{self.owner.login}/{self.name}")
+        return self.get_context(integration, installation_id).get_repo(f"{self.owner.login}/{self.name}")
 
-    def get_issue(self, integration: GithubIntegration, issue_number: int) -> GithubIssue:
+    def get_issue(
+            self, integration: GithubIntegration, issue_number: int, installation_id: Optional[int] = None
+    ) -> GithubIssue:
         """
         Get the issue object.
         :param integration: GithubIntegration
         :param issue_number: int
+        :param installation_id: Installation id from the payload
         :return: Issue
         """
-        return self.get_repo(integration).get_issue(number=issue_number)
+        return self.get_repo(integration, installation_id).get_issue(number=issue_number)
 
-    def get_comment(self, integration: GithubIntegration, comment_id: int) -> GithubCommitComment:
+    def get_comment(
+            self, integration: GithubIntegration, comment_id: int, installation_id: Optional[int] = None
+    ) -> GithubCommitComment:
         """
         Get the comment object.
         :param integration: GithubIntegration
         :param comment_id: int
+        :param installation_id: Installation id from the payload
         :return: Comment
         """
-        return self.get_repo(integration).get_comment(comment_id)
+        return self.get_repo(integration, installation_id).get_comment(comment_id)
 
     @property
     def is_fork(self):
@@ -249,12 +263,22 @@ class BaseEvent(BaseModel, ABC):
     organization: Optional[Organization] = None
     installation: Optional[Installation] = None
 
+    @property
+    def installation_id(self) -> Optional[int]:
+        return self.installation.id if self.installation else None
+
     def get_context(self, integration: GithubIntegration) -> Github:
         """
         Get the context for the event.
         :param integration: GithubIntegration
         :return: GitHub
         """
-        if self.installation:
-            return Github(login_or_token=integration.get_access_token(self.installation.id).token)
-        return self.repository.get_context(integration)
+        return self.repository.get_context(integration, self.installation_id)
+
+    def repo_client(self, integration: GithubIntegration) -> RepoClient:
+        """
+        Get the async client for the event repository.
+        :param integration: GithubIntegration
+        :return: RepoClient
+        """
+        return create_repo_client(integration, self.repository.full_name, installation_id=self.installation_id)
@@ -129,7 +129,9 @@ class CreateIssueCommentEvent(BaseEvent):
         :param integration: GithubIntegration
         :return:
         """
-        return self.repository.get_issue(integration=integration, issue_number=self.issue.number)
+        return self.repository.get_issue(
+            integration=integration, issue_number=self.issue.number, installation_id=self.installation_id
+        )
 
     def get_comment(self, integration: GithubIntegration):
         """
@@ -137,7 +139,9 @@ class CreateIssueCommentEvent(BaseEvent):
         :param integration: GithubIntegration
         :return:
         """
-        return self.repository.get_comment(integration=integration, comment_id=self.comment.id)
+        return self.repository.get_comment(
+            integration=integration, comment_id=self.comment.id, installation_id=self.installation_id
+        )
 
     def get_repo(self, integration: GithubIntegration):
         """
@@ -145,4 +149,4 @@ class CreateIssueCommentEvent(BaseEvent):
         :param integration: GithubIntegration
         :return:
         """
-        return self.repository.get_repo(integration=integration)
+        return self.repository.get_repo(integration=integration, installation_id=self.installation_id)
@@ -78,7 +78,9 @@ class OpenedIssueEvent(BaseEvent):
         :param integration: GithubIntegration
         :return: Issue
         """
-        return self.repository.get_issue(integration, issue_number=self.issue.number)
+        return self.repository.get_issue(
+            integration, issue_number=self.issue.number, installation_id=self.installation_id
+        )
 
     def get_repo(self, integration: GithubIntegration):
         """
@@ -86,7 +88,7 @@ class OpenedIssueEvent(BaseEvent):
         :param integration: GithubIntegration
         :return:
         """
-        return self.repository.get_repo(integration=integration)
+        return self.repository.get_repo(integration=integration, installation_id=self.installation_id)
 
 
 class ClosedIssueEvent(BaseEvent):
@@ -105,7 +107,9 @@ class ClosedIssueEvent(BaseEvent):
         :param integration: GithubIntegration
         :return: Issue
         """
-        return self.repository.get_issue(integration, issue_number=self.issue.number)
+        return self.repository.get_issue(
+            integration, issue_number=self.issue.number, installation_id=self.installation_id
+        )
 
     def get_repo(self, integration: GithubIntegration):
         """
@@ -113,4 +117,4 @@ class ClosedIssueEvent(BaseEvent):
         :param integration: GithubIntegration
         :return:
         """
-        return self.repository.get_repo(integration=integration)
+        return self.repository.get_repo(integration=integration, installation_id=self.installation_id)
@@ -121,7 +121,7 @@ class OpenedPullRequestEvent(BaseEvent):
         :param integration: GithubIntegration
         :return:
         """
-        return self.repository.get_repo(integration=integration)
+        return self.repository.get_repo(integration=integration, installation_id=self.installation_id)
 
 
 class ClosedPullRequestEvent(BaseEvent):
@@ -149,7 +149,7 @@ class ClosedPullRequestEvent(BaseEvent):
         :param integration: GithubIntegration
         :return:
         """
-        return self.repository.get_repo(integration=integration)
+        return self.repository.get_repo(integration=integration, installation_id=self.installation_id)
 
 
 class EditedPullRequestEvent(BaseEvent):
@@ -177,4 +177,4 @@ class EditedPullRequestEvent(BaseEvent):
         :param integration: GithubIntegration
         :return:
         """
-        return self.repository.get_repo(integration=integration)
+        return self.repository.get_repo(integration=integration, installation_id=self.installation_id)
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from typing import List, Optional, Union
+
+from pydantic import BaseModel, ConfigDict
+
+from ._base import Repository, Sender, Installation, Organization, BaseEvent
+
+PUSH_COMMITS_LIMIT = 2048
+"""Commits listed in a push payload at most, larger pushes are truncated"""
+
+
+class PushRepository(Repository):
+    created_at: Union[int, str]
+    """Unix timestamp in push payloads"""
+    pushed_at: Union[int, str]
+    default_branch: str
+
+
+class PushCommit(BaseModel):
+    id: str
+    message: str
+    added: List[str] = []
+    removed: List[str] = []
+    modified: List[str] = []
+
+    model_config = ConfigDict(extra="allow")
+
+    def touches(self, path: str) -> bool:
+        return path in self.added or path in self.removed or path in self.modified
+
+
+class PushEvent(BaseEvent):
+    action: Optional[str] = None
+    """Push events have no action"""
+    ref: str
+    """Full git ref that was pushed, e.g. refs/heads/main"""
+    before: str
+    after: str
+    created: bool
+    deleted: bool
+    forced: bool
+    commits: List[PushCommit]
+    repository: PushRepository
+    sender: Sender
+    organization: Optional[Organization] = None
+    installation: Optional[Installation] = None
+
+    model_config = ConfigDict(extra="allow")
+
+    @property
+    def on_default_branch(self) -> bool:
+        return self.ref == f"refs/heads/{self.repository.default_branch}"
+
+    def may_change(self, path: str) -> bool:
+        """
+        Whether the push may have changed a file.
+        Force pushes and truncated commit lists are assumed to change everything.
+        :param path: File path from the repository root
+        """
+        if self.forced or len(self.commits) >= PUSH_COMMITS_LIMIT:
+            return True
+        return any(commit.touches(path) for commit in self.commits)
@@ -1,13 +1,18 @@
 # -*- coding: utf-8 -*-
 
 import hmac
-import json
+import re
 from typing import Mapping, Optional, Dict, Any
 
 from pydantic.dataclasses import dataclass
 
+from .. import jsonlib
 from .exception import InvalidRequestError
 
+ACTION_SCAN_LIMIT = 256
+# GitHub serializes `action` as the first key of the payload
+_LEADING_ACTION = re.compile(rb'\s*\{\s*"action"\s*:\s*"([a-z_]{1,64})"')
+
 
 @dataclass
 class GitHubEvent:
@@ -49,10 +54,21 @@ def parse_event(headers: Mapping[str, str], raw_body: bytes,
         algo = "sha256" if signature_256 else "sha1"
         verify_signature(signature, raw_body, webhook_secret.encode("ascii"), algo=algo)
 
-    payload = json.loads(raw_body.decode(encoding))
+    payload = jsonlib.loads(raw_body, encoding=encoding)
     return GitHubEvent(event_name, delivery_id, signature_256 or signature_1, user_agent, payload)
 
 
+def peek_action(raw_body: bytes, limit: int = ACTION_SCAN_LIMIT) -> Optional[str]:
+    """
+    Reads the top-level `action` from the first bytes of a raw payload without decoding it.
+    Returns None when the action is not the leading key, callers must then fall back to a full parse.
+    """
+    match = _LEADING_ACTION.match(raw_body, 0, limit)
+    if match is None:
+        return None
+    return match.group(1).decode("ascii")
+
+
 def extract_mime_components(mime: str) -> tuple[str, list[tuple]]:
     """
     Extracts and returns the main type and parameters from a MIME type string.
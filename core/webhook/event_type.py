@@ -3,6 +3,7 @@
 from .event.issue_comment import CreateIssueCommentEvent
 from .event.issues import OpenedIssueEvent, ClosedIssueEvent
 from .event.pull_request import OpenedPullRequestEvent, ClosedPullRequestEvent, EditedPullRequestEvent
+from .event.push import PushEvent
 
 
 class BaseEventType(object):
@@ -93,9 +94,21 @@ class _PullRequest(BaseEventType):
         return "pull_request"
 
 
+class _Push(BaseEventType):
+    """
+    Push events carry no action, they are dispatched with the event name as action
+    """
+    PUSH = "push"
+    PUSH_EVENT = PushEvent
+
+    def __str__(self):
+        return "push"
+
+
 Issue = _Issue()
 IssueComment = _IssueComment()
 PullRequest = _PullRequest()
+Push = _Push()
 
 EVENT_MODEL = {
     (Issue.__str__(), Issue.OPENED): Issue.OPENED_EVENT,
@@ -104,4 +117,5 @@ EVENT_MODEL = {
     (PullRequest.__str__(), PullRequest.OPENED): PullRequest.OPENED_EVENT,
     (PullRequest.__str__(), PullRequest.CLOSED): PullRequest.CLOSED_EVENT,
     (PullRequest.__str__(), PullRequest.EDITED): PullRequest.EDITED_EVENT,
+    (Push.__str__(), Push.PUSH): Push.PUSH_EVENT,
 }
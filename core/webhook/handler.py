@@ -3,29 +3,56 @@ import asyncio
 import logging
 import uuid
 from functools import wraps
-from typing import Callable, Optional
+from typing import Callable, Optional, Type
 from typing import Dict, Union
 
-import uvicorn
 from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from loguru import logger
 from pydantic import BaseModel
 
-from .const import GITHUB_CACHE_EXPIRE, GITHUB_CACHE
-from .event_parser import parse_event
+from .context import EventContext
+from .dedup import DeliveryDeduplicator
+from .dispatch import DispatchTable
+from .event_parser import parse_event, peek_action, GitHubEvent
 from .event_type import EVENT_MODEL, BaseEventType
 from .exception import InvalidRequestError
+from .worker import EventWorkerPool
 
 
 class HandlerConfig:
-    escape_bot: bool = True
+    def __init__(self, escape_bot: bool = True):
+        """
+        :param escape_bot: Ignore events sent by bots
+        """
+        self.escape_bot = escape_bot
 
 
-def should_ignore_bot(config: HandlerConfig, model: BaseModel) -> bool:
+def should_ignore_bot(config: HandlerConfig, payload: dict) -> bool:
     """
     Returns True if the sender is a bot and the event should be ignored.
+    Reads the raw payload so the check does not require a validated model.
+    """
+    sender = payload.get("sender")
+    return bool(config.escape_bot and isinstance(sender, dict) and sender.get("type") == "Bot")
+
+
+class LazyEventModel:
+    """
+    Validates the payload of a single delivery on first access and shares the result.
+    The model is handed to every handler of the delivery and must be treated as read-only.
     """
-    return getattr(model, "sender", None) and config.escape_bot and model.sender.is_bot()
+
+    def __init__(self, loader: Callable[[], Optional[BaseModel]]):
+        self._loader = loader
+        self._loaded = False
+        self._model: Optional[BaseModel] = None
+
+    def get(self) -> Optional[BaseModel]:
+        if not self._loaded:
+            self._model = self._loader()
+            self._loaded = True
+        return self._model
 
 
 class InterceptHandler(logging.Handler):
@@ -43,11 +70,19 @@ class Handler:
     Logger for the GitHub webhook handler.
     """
 
-    def __init__(self, handler: Callable, desc: str, filter_func: Optional[Callable], config: HandlerConfig):
+    def __init__(
+            self,
+            handler: Callable,
+            desc: str,
+            filter_func: Optional[Callable],
+            config: HandlerConfig,
+            feature_flag: Optional[str] = None,
+    ):
         self.handler = handler
         self.desc = desc
         self.filter_func = filter_func
         self.config = config
+        self.feature_flag = feature_flag
 
 
 class GithubWebhookHandler:
@@ -55,18 +90,43 @@ class GithubWebhookHandler:
     A handler for GitHub webhooks.
     """
 
-    def __init__(self, log_server: bool = False, webhook_secret: Optional[str] = None):
+    def __init__(
+            self,
+            log_server: bool = False,
+            webhook_secret: Optional[str] = None,
+            background: bool = False,
+            workers: int = 4,
+            max_queue_size: int = 1000,
+            deduplicator: Optional[DeliveryDeduplicator] = None,
+            context_factory: Callable[[BaseModel], EventContext] = EventContext,
+    ):
         """
         Initialize the GitHub webhook handler.
         :param log_server: Whether to log server events.
         :param webhook_secret: Secret key for validating incoming webhooks.
+        :param background: Acknowledge deliveries with 202 and process them in a worker pool.
+        :param workers: Number of background workers, only used when `background` is set.
+        :param max_queue_size: Maximum number of queued deliveries, only used when `background` is set.
+        :param deduplicator: Index of processed delivery ids, redelivered events are dropped.
+        :param context_factory: Builds the per-delivery context passed to handlers taking two arguments.
         """
         self.app = FastAPI()
         self.handlers: Dict[
             str, Dict[str, Dict[int, Dict[str, Handler]]]] = {}
+        self.dispatch_table: DispatchTable = DispatchTable.compile(self.handlers)
         self.debug: bool = False
         self.log_server = log_server
         self.webhook_secret = webhook_secret
+        self.deduplicator = deduplicator
+        self.context_factory = context_factory
+        self.gate_skips: Dict[str, int] = {}
+        self.worker_pool: Optional[EventWorkerPool] = None
+        if background:
+            self.worker_pool = EventWorkerPool(
+                consumer=self.dispatch,
+                workers=workers,
+                max_queue_size=max_queue_size
+            )
         self._configure_logging()
 
         @self.app.post("/")
@@ -74,21 +134,92 @@ class GithubWebhookHandler:
             """Handle incoming webhook requests from GitHub."""
             try:
                 headers = request.headers
+                event_name = headers.get("X-GitHub-Event")
+                if event_name and not self.dispatch_table.accepts(event_name):
+                    logger.debug(f"Event<{event_name}> received, no handlers registered.")
+                    return {"status": "ignored"}
                 raw_body = await request.body()
+                action = peek_action(raw_body)
+                if action and not self.dispatch_table.accepts(event_name, action):
+                    logger.debug(f"Event<{event_name}>({action}) received, no handlers registered.")
+                    return {"status": "ignored"}
                 try:
                     event = parse_event(headers, raw_body, self.webhook_secret)
                 except InvalidRequestError as exc:
                     logger.error(f"Invalid webhook request: {exc}")
                     return {"status": "error", "details": "Invalid webhook request"}
 
-                if event.name and event.payload.get("action"):
-                    await self.handle_event(event.name, event.payload["action"], event.payload)
+                if self.deduplicator is not None and await self.deduplicator.seen(event.delivery_id):
+                    logger.info(f"Duplicate delivery {event.delivery_id} for Event<{event.name}> ignored")
+                    return {"status": "duplicate"}
 
+                if self.worker_pool is not None:
+                    await self.worker_pool.start()
+                    if not self.worker_pool.submit(event):
+                        await self._release_delivery(event)
+                        return JSONResponse(
+                            {"status": "error", "details": "Webhook queue is full"}, status_code=503
+                        )
+                    return JSONResponse({"status": "accepted"}, status_code=202)
+
+                await self.dispatch(event)
                 return {"status": "ok"}
             except Exception as exc:
                 logger.error(f"Webhook listener encountered an error: {exc}")
                 return {"status": "error", "details": "Server encountered an error, check logs for details"}
 
+        @self.app.get("/status/queue")
+        async def queue_status():
+            """Report queue depth and per-worker utilization of the background mode."""
+            if self.worker_pool is None:
+                return {"status": "disabled"}
+            return self.worker_pool.stats()
+
+        @self.app.get("/status/dedup")
+        async def dedup_status():
+            """Report hit and miss counters of the delivery deduplication index."""
+            if self.deduplicator is None:
+                return {"status": "disabled"}
+            return self.deduplicator.stats()
+
+        @self.app.get("/status/routes")
+        async def routes_status():
+            """Report the compiled dispatch table."""
+            return self.dispatch_table.snapshot()
+
+        @self.app.get("/status/gates")
+        async def gates_status():
+            """Report how many times each listener was skipped because its feature flag is disabled."""
+            return self.gate_skips
+
+    async def start_workers(self):
+        """Start the background worker pool, if enabled."""
+        if self.worker_pool is not None:
+            await self.worker_pool.start()
+
+    async def stop_workers(self, timeout: float = 30):
+        """Drain and stop the background worker pool, if enabled."""
+        if self.worker_pool is not None:
+            await self.worker_pool.stop(timeout=timeout)
+
+    async def dispatch(self, event: GitHubEvent):
+        """
+        Route a parsed webhook event to the registered handlers.
+        Events without an action, such as push, are routed with the event name as action.
+        """
+        if not event.name:
+            return
+        try:
+            await self.handle_event(event.name, event.payload.get("action") or event.name, event.payload)
+        except Exception:
+            # Let GitHub redeliver an event whose dispatch failed
+            await self._release_delivery(event)
+            raise
+
+    async def _release_delivery(self, event: GitHubEvent):
+        if self.deduplicator is not None:
+            await self.deduplicator.release(event.delivery_id)
+
     def register_listener(
             self,
             event_type: Union[BaseEventType, str],
@@ -98,10 +229,12 @@ class GithubWebhookHandler:
             desc: str = "listener",
             filter_func: Optional[Callable[[dict], bool]] = None,
             config: HandlerConfig = HandlerConfig(),
-            priority: int = 10
+            priority: int = 10,
+            feature_flag: Optional[str] = None
     ):
         """
         Register a handler for a specific GitHub event type and action without using a decorator.
+        :param feature_flag: Setting the listener depends on, resolved with `EventContext.enabled` before it runs.
         """
         if not isinstance(event_type, str):
             event_type = str(event_type)
@@ -118,7 +251,9 @@ class GithubWebhookHandler:
             desc=desc,
             filter_func=filter_func,
             config=config,
+            feature_flag=feature_flag,
         )
+        self.dispatch_table = DispatchTable.compile(self.handlers)
         logger.info(
             f"Registered listener for Event<{event_type}>({action}) with unique_id {unique_id} --desc {desc}"
         )
@@ -131,7 +266,8 @@ class GithubWebhookHandler:
             desc: str = "listener",
             filter_func: Optional[Callable[[dict], bool]] = None,
             config: HandlerConfig = HandlerConfig(),
-            priority: int = 10
+            priority: int = 10,
+            feature_flag: Optional[str] = None
     ):
         if not isinstance(event_type, str):
             event_type = str(event_type)
@@ -149,8 +285,10 @@ class GithubWebhookHandler:
                 handler=func,
                 desc=desc,
                 filter_func=filter_func,
-                config=config
+                config=config,
+                feature_flag=feature_flag
             )
+            self.dispatch_table = DispatchTable.compile(self.handlers)
 
             logger.info(
                 f"Registered listener for Event<{event_type}>({action}) with unique_id {unique_id} --desc {desc}"
@@ -170,53 +308,94 @@ class GithubWebhookHandler:
 
     async def handle_event(self, event_type: str, action: str, payload: dict):
         """Handle incoming GitHub webhook events."""
-        handlers_per_priority = self.handlers.get(event_type, {}).get(action, {})
-        if not handlers_per_priority:
+        route = self.dispatch_table.lookup(event_type, action)
+        if not route:
             logger.debug(f"Event<{event_type}>({action}) received, no handlers registered.")
             return
 
-        for priority in sorted(handlers_per_priority.keys()):
-            handlers = handlers_per_priority[priority].values()
-            tasks = []
-            for handler_obj in handlers:
-                handler = handler_obj.handler
-                config = handler_obj.config
-                filter_func = handler_obj.filter_func
-
-                if filter_func and not self.apply_filter(filter_func, payload):
-                    logger.info(f"Event<{event_type}>({action}) filtered for handler with desc: {handler_obj.desc}")
-                    continue
-
-                model = self.get_event_model(event_type, action, payload)
-                if not model:
-                    logger.warning(f"Event<{event_type}>({action}) model not found")
-                    continue
-
-                if should_ignore_bot(config, model):
-                    logger.info(
-                        f"Event<{event_type}>({action}) ignored due to bot sender "
-                        f"for handler with desc: {handler_obj.desc}"
-                    )
-                    continue
-
-                if self.debug:
-                    print(f"Debug Event Received <{event_type}>({action})")
-                    print(model.model_dump())
-
-                tasks.append(self._execute_handler(handler, model))
-
-            if tasks:
-                # Execute the handlers concurrently
-                await asyncio.gather(*tasks)
+        event_model = LazyEventModel(lambda: self.validate_model(route.model_class, event_type, action, payload))
+        context: Optional[EventContext] = None
+        try:
+            for tier in route.tiers:
+                tasks = []
+                for handler_obj in tier:
+                    handler = handler_obj.handler
+                    config = handler_obj.config
+                    filter_func = handler_obj.filter_func
+
+                    if filter_func and not self.apply_filter(filter_func, payload):
+                        logger.info(
+                            f"Event<{event_type}>({action}) filtered for handler with desc: {handler_obj.desc}"
+                        )
+                        continue
+
+                    if should_ignore_bot(config, payload):
+                        logger.info(
+                            f"Event<{event_type}>({action}) ignored due to bot sender "
+                            f"for handler with desc: {handler_obj.desc}"
+                        )
+                        continue
+
+                    model = event_model.get()
+                    if not model:
+                        logger.warning(f"Event<{event_type}>({action}) model not found")
+                        return
+
+                    if self.debug:
+                        print(f"Debug Event Received <{event_type}>({action})")
+                        print(model.model_dump())
+
+                    if context is None and (handler_obj.pass_context or handler_obj.feature_flag):
+                        context = self.context_factory(model)
+
+                    if handler_obj.feature_flag and not await self.check_feature(context, handler_obj.feature_flag):
+                        skip_key = f"{event_type}.{action}:{handler_obj.unique_id}"
+                        self.gate_skips[skip_key] = self.gate_skips.get(skip_key, 0) + 1
+                        logger.debug(
+                            f"Event<{event_type}>({action}) skipped, {handler_obj.feature_flag} is disabled "
+                            f"for handler with desc: {handler_obj.desc}"
+                        )
+                        continue
+
+                    if handler_obj.pass_context:
+                        tasks.append(self._execute_handler(handler, model, context))
+                    else:
+                        tasks.append(self._execute_handler(handler, model))
+
+                if tasks:
+                    # Execute the handlers concurrently
+                    await asyncio.gather(*tasks)
+        finally:
+            if context is not None:
+                await self._close_context(context)
 
     @staticmethod
-    async def _execute_handler(handler: Callable, model: BaseModel):
+    async def _execute_handler(handler: Callable, model: BaseModel, context: Optional[EventContext] = None):
         """Helper method to execute a handler and log any exceptions."""
         try:
-            await handler(model)
+            if context is not None:
+                await handler(model, context)
+            else:
+                await handler(model)
         except Exception as exc:
             logger.exception(f"Error executing handler: {exc}")
 
+    @staticmethod
+    async def _close_context(context: EventContext):
+        try:
+            await context.close()
+        except Exception as exc:
+            logger.exception(f"Error closing event context: {exc}")
+
+    @staticmethod
+    async def check_feature(context: EventContext, feature_flag: str) -> bool:
+        """Resolve a feature flag through the context, disabled if it cannot be resolved."""
+        try:
+            return await context.enabled(feature_flag)
+        except Exception as exc:
+            logger.error(f"Error resolving feature flag {feature_flag}: {exc}")
+            return False
+
     @staticmethod
     def apply_filter(filter_func: Callable[[dict], bool], payload: dict) -> bool:
         """Apply the filter function to the payload."""
@@ -230,7 +409,13 @@ class GithubWebhookHandler:
     def get_event_model(event_type: Union[BaseEventType, str], action: str, payload: dict) -> Optional[BaseModel]:
         """Retrieve the appropriate model for the specified event type and action."""
         event_key = str(event_type)
-        model_class = EVENT_MODEL.get((event_key, action))
+        return GithubWebhookHandler.validate_model(EVENT_MODEL.get((event_key, action)), event_key, action, payload)
+
+    @staticmethod
+    def validate_model(
+            model_class: Optional[Type[BaseModel]], event_key: str, action: str, payload: dict
+    ) -> Optional[BaseModel]:
+        """Validate the payload against an already resolved model class."""
         if model_class:
             try:
                 return model_class.model_validate(payload)
@@ -251,25 +436,9 @@ class GithubWebhookHandler:
 
     def run(self, host: str = "0.0.0.0", port: int = 8000, **kwargs):
         """Run the FastAPI application."""
+        import uvicorn
+
         config = uvicorn.Config(self.app, host=host, port=port, log_config=None, **kwargs)
         server = uvicorn.Server(config)
         logger.info(f"Starting server at {host}:{port}")
         server.run()
-
-
-try:
-    if GITHUB_CACHE:
-        import requests_cache
-
-        requests_cache.install_cache(
-            cache_control=True,
-            urls_expire_after={
-                '*.github.com': GITHUB_CACHE_EXPIRE,
-                # Placeholder expiration; should be overridden by Cache-Control
-                '*': requests_cache.DO_NOT_CACHE,
-                # Don't cache anything other than GitHub requests
-            },
-        )
-        logger.info("PyGithub cache installed")
-except Exception as e:
-    logger.error(f"Failed to install cache: {e}, do you have requests_cache installed?")
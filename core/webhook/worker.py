@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from loguru import logger
+
+from .event_parser import GitHubEvent
+
+
+@dataclass
+class WorkerStats:
+    """Runtime statistics of a single queue worker."""
+    worker_id: int
+    started_at: float = field(default_factory=time.monotonic)
+    busy_seconds: float = 0.0
+    processed: int = 0
+    failed: int = 0
+    current_delivery: Optional[str] = None
+    _busy_since: Optional[float] = None
+
+    @property
+    def utilization(self) -> float:
+        """Share of the worker lifetime spent processing events, between 0 and 1."""
+        now = time.monotonic()
+        busy = self.busy_seconds
+        if self._busy_since is not None:
+            busy += now - self._busy_since
+        elapsed = now - self.started_at
+        return round(busy / elapsed, 4) if elapsed > 0 else 0.0
+
+    def dump(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "processed": self.processed,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "utilization": self.utilization,
+            "current_delivery": self.current_delivery,
+        }
+
+
+class EventWorkerPool:
+    """
+    A bounded queue of verified webhook events drained by a fixed pool of async workers.
+    """
+
+    def __init__(
+            self,
+            consumer: Callable[[GitHubEvent], Awaitable[None]],
+            workers: int = 4,
+            max_queue_size: int = 1000,
+    ):
+        """
+        :param consumer: Coroutine function called for every queued event.
+        :param workers: Number of concurrent workers draining the queue.
+        :param max_queue_size: Maximum number of pending events, 0 for unbounded.
+        """
+        if workers < 1:
+            raise ValueError("workers must be greater than 0")
+        self.consumer = consumer
+        self.workers = workers
+        self.max_queue_size = max_queue_size
+        self.accepted = 0
+        self.rejected = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stats: Dict[int, WorkerStats] = {}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def depth(self) -> int:
+        """Number of events waiting in the queue."""
+        return self._queue.qsize() if self._queue else 0
+
+    async def start(self):
+        """Create the queue and spawn the workers, no-op when already running."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._stats = {i: WorkerStats(worker_id=i) for i in range(self.workers)}
+        self._tasks = [
+            asyncio.create_task(self._work(self._stats[i]), name=f"webhook-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"Webhook worker pool started --workers {self.workers} --queue {self.max_queue_size}")
+
+    async def stop(self, timeout: float = 30):
+        """
+        Stop the workers, waiting up to `timeout` seconds for the queue to drain.
+        """
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Webhook worker pool stopped with {self.depth} events left in queue")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Webhook worker pool stopped")
+
+    def submit(self, event: GitHubEvent) -> bool:
+        """
+        Enqueue an event without waiting.
+        :param event: GitHubEvent
+        :return: False if the queue is full or the pool is not running
+        """
+        if not self.running:
+            self.rejected += 1
+            return False
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            logger.warning(f"Webhook queue is full, rejecting delivery {event.delivery_id}")
+            return False
+        self.accepted += 1
+        return True
+
+    async def _work(self, stats: WorkerStats):
+        while True:
+            event = await self._queue.get()
+            stats.current_delivery = event.delivery_id
+            stats._busy_since = time.monotonic()
+            try:
+                await self.consumer(event)
+                stats.processed += 1
+            except Exception as exc:
+                stats.failed += 1
+                logger.exception(f"Worker {stats.worker_id} failed on delivery {event.delivery_id}: {exc}")
+            finally:
+                stats.busy_seconds += time.monotonic() - stats._busy_since
+                stats._busy_since = None
+                stats.current_delivery = None
+                self._queue.task_done()
+
+    def stats(self) -> dict:
+        """Queue depth and per-worker utilization."""
+        return {
+            "running": self.running,
+            "queue_depth": self.depth,
+            "queue_capacity": self.max_queue_size,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "workers": [stats.dump() for stats in self._stats.values()],
+        }
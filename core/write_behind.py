@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from loguru import logger
+
+Changes = Dict[str, Any]
+
+
+class WriteBehindBuffer:
+    """
+    Bounded write-behind buffer of field updates.
+
+    Updates are merged per key and handed to `writer` in batches, when `max_batch` keys are
+    pending or `flush_interval` seconds have passed, whichever comes first. Pending changes
+    can be read back with `pending_changes` so readers see their own writes before the flush.
+    """
+
+    def __init__(
+            self,
+            writer: Callable[[List[Tuple[Hashable, Changes]]], Awaitable[None]],
+            max_batch: int = 100,
+            flush_interval: float = 1.0,
+            max_pending: int = 10000,
+    ):
+        """
+        :param writer: Coroutine function writing a batch of (key, changes) in one round trip
+        :param max_batch: Pending keys that trigger a flush
+        :param flush_interval: Seconds between time-based flushes
+        :param max_pending: Pending keys above which `put` waits for a flush
+        """
+        if max_batch < 1:
+            raise ValueError("max_batch must be greater than 0")
+        self.writer = writer
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max(max_pending, max_batch)
+        self.flushes = 0
+        self.written = 0
+        self.failed = 0
+        self.last_batch_size = 0
+        self.max_batch_size = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+        self._pending: Dict[Hashable, Changes] = {}
+        self._inflight: Dict[Hashable, Changes] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def start(self):
+        """Start the background flush loop, no-op when already running."""
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run(), name="write-behind")
+        logger.info(f"Write-behind buffer started --batch {self.max_batch} --interval {self.flush_interval}s")
+
+    async def stop(self):
+        """Stop the flush loop and drain everything still pending."""
+        if not self.running:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+        if self._pending:
+            logger.error(f"Write-behind buffer stopped with {self.pending} unwritten updates")
+        logger.info("Write-behind buffer stopped")
+
+    async def put(self, key: Hashable, changes: Changes):
+        """
+        Queue changes for a key, merged over changes already pending for it.
+        Waits for a flush when the buffer is full.
+        """
+        if key not in self._pending and len(self._pending) >= self.max_pending:
+            await self.flush()
+        self._pending.setdefault(key, {}).update(changes)
+        if len(self._pending) >= self.max_batch and self._wakeup is not None:
+            self._wakeup.set()
+
+    def pending_changes(self, key: Hashable) -> Changes:
+        """Changes queued or being written for a key, not yet confirmed by the writer."""
+        return {**self._inflight.get(key, {}), **self._pending.get(key, {})}
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write every pending change with one `writer` call per `max_batch` keys."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while self._pending:
+                keys = list(self._pending)[:self.max_batch]
+                batch = [(key, self._pending.pop(key)) for key in keys]
+                self._inflight = dict(batch)
+                started = time.perf_counter()
+                try:
+                    await self.writer(batch)
+                except Exception as exc:
+                    self.failed += len(batch)
+                    logger.exception(f"Write-behind flush of {len(batch)} updates failed: {exc}")
+                    self._requeue(batch)
+                    return
+                finally:
+                    self._inflight = {}
+                elapsed = time.perf_counter() - started
+                self.flushes += 1
+                self.written += len(batch)
+                self.last_batch_size = len(batch)
+                self.max_batch_size = max(self.max_batch_size, len(batch))
+                self.last_flush_seconds = elapsed
+                self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+                self.total_flush_seconds += elapsed
+
+    def _requeue(self, batch: List[Tuple[Hashable, Changes]]):
+        """Put a failed batch back, under changes queued for the same keys in the meantime."""
+        for key, changes in batch:
+            if key not in self._pending and len(self._pending) >= self.max_pending:
+                logger.error(f"Write-behind buffer is full, dropping update of {key}")
+                continue
+            self._pending[key] = {**changes, **self._pending.get(key, {})}
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "pending": self.pending,
+            "flushes": self.flushes,
+            "written": self.written,
+            "failed": self.failed,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_batch_size,
+            "avg_batch_size": round(self.written / self.flushes, 2) if self.flushes else 0,
+            "last_flush_ms": round(self.last_flush_seconds * 1000, 3),
+            "max_flush_ms": round(self.max_flush_seconds * 1000, 3),
+            "avg_flush_ms": round(self.total_flush_seconds * 1000 / self.flushes, 3) if self.flushes else 0,
+        }
@@ -1,10 +1,9 @@
 from loguru import logger
 
-from const import git_integration, get_credentials, fetch_operation
-from core.mongo import global_client
+from const import RepoContext
+from core.operation_store import update_operation
 from core.openai import OpenAI
 from core.openai.cell import UserMessage, SystemMessage
-from core.utils import get_repo_setting
 from core.webhook.event_type import Issue
 
 format_prompt = """
@@ -18,30 +17,34 @@ Summary the content of the issue and improve the readability by following these
 """
 
 
+def summary_body(body: str, summary: str) -> str:
+    """Append the summary to the original body in a collapsed section."""
+    return (
+        f"{body}"
+        f"\n\n----"
+        "\n<details>"
+        "\n<summary>Summary</summary>"
+        f"\n\n{summary}"
+        "\n</details>"
+    )
+
+
 # @webhook_handler.listen(Issue, action=Issue.OPENED, unique_id="issue_title_unify")
-async def issue_body_format(event: Issue.OPENED_EVENT):
+async def issue_body_format(event: Issue.OPENED_EVENT, context: RepoContext):
     logger.info("Received Issue.OPEN event")
-    repo = event.repository.get_repo(git_integration)
-    repo_setting = get_repo_setting(
-        repo_name=event.repository.full_name,
-        repo=repo
-    )
+    repo_setting = await context.repo_setting()
     if not repo_setting.issue_body_format:
         return logger.debug("issue_body_format is disabled")
-    operation = await fetch_operation(
-        repo_name=event.repository.full_name,
-        issue_id=event.issue.id
-    )
+    if repo_setting.issue_triage:
+        return logger.debug("Issue is handled by issue_triage")
+    operation = await context.operation()
     if not operation:
         return logger.error("Failed to fetch issue operation")
     if operation.body_format:
         return logger.debug("Issue body_format has been unified")
     prompt_rule = repo_setting.issue_body_format_prompt or format_prompt
     try:
-        credit_card, oai_credential = await get_credentials(
-            repo_name=event.repository.full_name,
-            repo=repo
-        )
+        credit_card, oai_credential = await context.credentials()
     except Exception as e:
         return logger.info(f"Skip get credit: {e}")
     body = event.issue.body or "No description provided."
@@ -76,17 +79,8 @@ async def issue_body_format(event: Issue.OPENED_EVENT):
         return None
     if better_issue:
         logger.info(f"Update issue body to {event.issue.html_url}")
-        issue = event.get_issue(integration=git_integration)
-        edited_body = (
-            f"{body}"
-            f"\n\n----"
-            "\n<details>"
-            "\n<summary>Summary</summary>"
-            f"\n\n{better_issue}"
-            "\n</details>"
-        )
-        issue.edit(
-            body=edited_body
+        context.writes.edit_issue(
+            event.issue.number,
+            body=summary_body(body, better_issue),
+            on_written=lambda: update_operation(operation, body_format=better_issue)
         )
-        operation.body_format = better_issue
-        await global_client.save(operation)
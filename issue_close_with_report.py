@@ -2,16 +2,13 @@
 # @Author  : sudoskys
 from typing import List
 
-from github.Issue import Issue as GithubIssue
-from github.IssueComment import IssueComment
-from github.PaginatedList import PaginatedList
 from loguru import logger
 
-from const import git_integration, get_credentials, fetch_operation
-from core.mongo import global_client
+from const import RepoContext
+from core.github_app import RepoClient
+from core.operation_store import update_operation
 from core.openai import OpenAI
 from core.openai.cell import SystemMessage, UserMessage
-from core.utils import get_repo_setting
 from core.webhook.event_type import Issue
 
 prompt_rule = """
@@ -27,34 +24,25 @@ Write a brief, formal report describing the solution and final outcome of an iss
 
 
 # @webhook_handler.listen(Issue, action=Issue.CLOSED, unique_id="close_issue_with_report")
-async def close_issue_with_report(event: Issue.CLOSED_EVENT) -> None:
+async def close_issue_with_report(event: Issue.CLOSED_EVENT, context: RepoContext) -> None:
     logger.info("Received Issue.CLOSED event")
-    repo = event.repository.get_repo(git_integration)
-    repo_setting = get_repo_setting(
-        repo_name=event.repository.full_name,
-        repo=repo
-    )
+    client = context.client
+    repo_setting = await context.repo_setting()
     if not repo_setting.issue_close_with_report:
         return logger.debug("Issue close with report is disabled")
-    operation = await fetch_operation(
-        repo_name=event.repository.full_name,
-        issue_id=event.issue.id
-    )
+    operation = await context.operation()
     if not operation:
         return logger.error("Failed to fetch issue operation")
     if operation.report_comment_id:
         logger.debug("Issue has been reported")
         pass
     try:
-        credit_card, oai_credential = await get_credentials(
-            repo_name=event.repository.full_name,
-            repo=repo
-        )
+        credit_card, oai_credential = await context.credentials()
     except Exception as e:
         logger.info(f"Skip get credit: {e}")
         return
 
-    prompt_docs = generate_prompt(event, repo_setting)
+    prompt_docs = await generate_prompt(event, client)
     repo_details = (
         f"Hint: This issue is from {event.repository.owner.login}"
         f"\nRepository: {event.repository.full_name}"
@@ -85,38 +73,37 @@ async def close_issue_with_report(event: Issue.CLOSED_EVENT) -> None:
 
     if report_content:
         logger.info(f"Add report to issue {event.issue.html_url}")
-        await update_state(event, report_content)
+        await update_state(event, context, report_content)
 
 
-def generate_prompt(event: Issue.CLOSED_EVENT, repo_setting) -> List[str]:
+async def generate_prompt(event: Issue.CLOSED_EVENT, client: RepoClient) -> List[str]:
     oai_body = [f"Issue: {event.issue.title}", f"Content: {event.issue.body}"]
-    issue: GithubIssue = event.repository.get_issue(integration=git_integration, issue_number=event.issue.number)
-    comments: PaginatedList[IssueComment] = issue.get_comments()
+    comments = await client.get_comments(event.issue.number)
     selected_comments = {}
     if comments:
-        if comments.totalCount > 2:
+        if len(comments) > 2:
             first_comment = comments[0]
             last_comment = comments[-1]
-            selected_comments[first_comment.id] = first_comment
-            selected_comments[last_comment.id] = last_comment
+            selected_comments[first_comment["id"]] = first_comment
+            selected_comments[last_comment["id"]] = last_comment
 
-            reactions = [(comment.reactions.get("total_count", 0), comment) for comment in comments]
+            reactions = [(comment.get("reactions", {}).get("total_count", 0), comment) for comment in comments]
             top_reactions = sorted(reactions, key=lambda x: x[0], reverse=True)[:2]
 
-            for _, comment in top_reactions:
-                if comment.reactions.get("total_count", 0) > 0:
-                    selected_comments[comment.id] = comment
+            for total_count, comment in top_reactions:
+                if total_count > 0:
+                    selected_comments[comment["id"]] = comment
         else:
-            selected_comments = {comment.id: comment for comment in comments}
+            selected_comments = {comment["id"]: comment for comment in comments}
 
         selected_comments = dict(sorted(selected_comments.items()))
     for comment in selected_comments.values():
-        if comment.user.type == "Bot":
+        if comment["user"]["type"] == "Bot":
             continue
-        oai_body.append(f"Comment#{comment.id}:\n @{comment.user.login} said: {comment.body}\n")
+        oai_body.append(f"Comment#{comment['id']}:\n @{comment['user']['login']} said: {comment['body']}\n")
 
-    if issue.pull_request:
-        oai_body.append(f"Pull Request: {issue.pull_request.html_url}")
+    if event.issue.pull_request:
+        oai_body.append(f"Pull Request: {event.issue.pull_request.get('html_url')}")
     # 创建
     oai_body.append(
         f">Created By: @{event.issue.user.login} \nCreated At: {event.issue.created_at.strftime('%Y-%m-%d %H:%M:%S')}"
@@ -128,18 +115,13 @@ def generate_prompt(event: Issue.CLOSED_EVENT, repo_setting) -> List[str]:
     return oai_body
 
 
-async def update_state(event: Issue.CLOSED_EVENT, report_content: str) -> None:
-    issue: GithubIssue = event.repository.get_issue(integration=git_integration, issue_number=event.issue.number)
-    saved_issue = await fetch_operation(
-        repo_name=event.repository.full_name,
-        issue_id=event.issue.number
-    )
+async def update_state(event: Issue.CLOSED_EVENT, context: RepoContext, report_content: str) -> None:
+    client = context.client
+    saved_issue = await context.operation()
     if not saved_issue:
         return logger.error("Failed to fetch issue operation")
     if saved_issue.report_comment_id:
-        reply = issue.get_comment(saved_issue.report_comment_id)
-        reply.edit(report_content)
+        await client.edit_comment(event.issue.number, saved_issue.report_comment_id, report_content)
     else:
-        reply = issue.create_comment(report_content)
-        saved_issue.report_comment_id = reply.id
-        await global_client.save(saved_issue)
+        reply = await client.create_comment(event.issue.number, report_content)
+        await update_operation(saved_issue, report_comment_id=reply["id"])
@@ -1,11 +1,10 @@
 from loguru import logger
 from pydantic import BaseModel, Field
 
-from const import git_integration, get_credentials, fetch_operation
-from core.mongo import global_client
+from const import RepoContext
+from core.operation_store import update_operation
 from core.openai import OpenAI
 from core.openai.cell import UserMessage, SystemMessage
-from core.utils import get_repo_setting
 from core.webhook.event_type import Issue
 
 format_prompt = """
@@ -23,29 +22,21 @@ Examples:
 
 
 # @webhook_handler.listen(Issue, action=Issue.OPENED, unique_id="issue_title_unify")
-async def issue_title_format(event: Issue.OPENED_EVENT):
+async def issue_title_format(event: Issue.OPENED_EVENT, context: RepoContext):
     logger.info("Received Issue.OPEN event")
-    repo = event.repository.get_repo(git_integration)
-    repo_setting = get_repo_setting(
-        repo_name=event.repository.full_name,
-        repo=repo
-    )
+    repo_setting = await context.repo_setting()
     if not repo_setting.issue_title_format:
         return logger.debug("issue_title_format is disabled")
-    operation = await fetch_operation(
-        repo_name=event.repository.full_name,
-        issue_id=event.issue.id
-    )
+    if repo_setting.issue_triage:
+        return logger.debug("Issue is handled by issue_triage")
+    operation = await context.operation()
     if not operation:
         return logger.error("Failed to fetch issue operation")
     if operation.title_format:
         return logger.debug("Issue title has been unified")
     prompt_rule = repo_setting.issue_title_format_prompt or format_prompt
     try:
-        credit_card, oai_credential = await get_credentials(
-            repo_name=event.repository.full_name,
-            repo=repo
-        )
+        credit_card, oai_credential = await context.credentials()
     except Exception as e:
         return logger.info(f"Skip get credit: {e}")
     prompt = (
@@ -71,12 +62,11 @@ async def issue_title_format(event: Issue.OPENED_EVENT):
     if better_issue:
         title = better_issue.issue_title
         logger.info(f"Standardized title: {event.issue.html_url}")
-        issue = event.get_issue(integration=git_integration)
-        issue.edit(
-            title=title
+        context.writes.edit_issue(
+            event.issue.number,
+            title=title,
+            on_written=lambda: update_operation(operation, title_format=title)
         )
-        operation.title_format = title
-        await global_client.save(operation)
 
 
 class BetterIssue(BaseModel):
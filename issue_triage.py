@@ -0,0 +1,76 @@
+from loguru import logger
+
+from const import RepoContext
+from core.credit import AIPromptProcessor
+from core.operation_store import update_operation
+from core.webhook.event_type import Issue
+from issue_body_format import format_prompt as body_format_prompt, summary_body
+from issue_title_format import format_prompt as title_format_prompt
+
+
+# @webhook_handler.listen(Issue, action=Issue.OPENED, unique_id="issue_triage")
+async def issue_triage(event: Issue.OPENED_EVENT, context: RepoContext):
+    logger.info("Received Issue.OPEN event")
+    client = context.client
+    repo_setting = await context.repo_setting()
+    if not repo_setting.issue_triage:
+        return logger.debug("issue_triage is disabled")
+    operation = await context.operation()
+    if not operation:
+        return logger.error("Failed to fetch issue operation")
+    need_labels = repo_setting.issue_auto_label and not operation.labels
+    need_title = repo_setting.issue_title_format and not operation.title_format
+    need_body = repo_setting.issue_body_format and not operation.body_format
+    if not (need_labels or need_title or need_body):
+        return logger.debug("Issue has been triaged")
+    try:
+        credit_card, oai_credential = await context.credentials()
+    except Exception as e:
+        return logger.info(f"Skip get credit: {e}")
+    labels = await client.get_labels() if need_labels else None
+    body = event.issue.body or "No description provided."
+    repo_details = (
+        f"Hint: This issue is from {event.repository.owner.login}"
+        f"\nRepository: {event.repository.full_name}"
+        f"\nRepo Desc: {event.repository.description}"
+        f"\nRepo Topics: {event.repository.topics}"
+        f"\nIssue URL: {event.issue.html_url}"
+    )
+    result = await AIPromptProcessor.triage(
+        title=event.issue.title,
+        body=body,
+        repo_details=repo_details,
+        oai_credential=oai_credential,
+        credit_card=credit_card,
+        labels=labels,
+        title_rule=(repo_setting.issue_title_format_prompt or title_format_prompt) if need_title else None,
+        body_rule=(repo_setting.issue_body_format_prompt or body_format_prompt) if need_body else None,
+        language=repo_setting.language,
+    )
+    if not result:
+        return None
+    best_labels = [label for label in getattr(result, "best_labels", [])[:3] if label in (labels or [])]
+    if best_labels:
+        context.writes.add_labels(
+            event.issue.number,
+            *best_labels,
+            on_written=lambda: update_operation(operation, labels=best_labels)
+        )
+    edited = {}
+    issue_title = getattr(result, "issue_title", None)
+    if issue_title:
+        edited["title_format"] = issue_title
+    body_summary = getattr(result, "body_summary", None)
+    if body_summary:
+        edited["body_format"] = body_summary
+    if edited:
+        context.writes.edit_issue(
+            event.issue.number,
+            title=issue_title or None,
+            body=summary_body(body, body_summary) if body_summary else None,
+            on_written=lambda: update_operation(operation, **edited)
+        )
+    updated = (["labels"] if best_labels else []) + list(edited)
+    if not updated:
+        return logger.debug("Nothing to update after triage")
+    logger.info(f"Triage issue {event.issue.html_url}: {', '.join(updated)}")
@@ -1,26 +1,80 @@
 # -*- coding: utf-8 -*-
 # @Author  : sudoskys
+import asyncio
 from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
 from fastapi import FastAPI
+from loguru import logger
 
-from const import webhook_handler
-from core.webhook.event_type import Issue
+from const import install_github_http_cache, webhook_handler
+from core.cache import cache_registry
+from core.github_app import close_rest_client
+from core.mongo import ensure_delivery_indexes, ensure_http_cache_indexes, ensure_shared_cache_indexes
+from core.operation_store import OperationSetting, get_operation_store, operation_writer
+from core.webhook.event_type import Issue, Push
+from core.webhook.handler import HandlerConfig
 from issue_auto_label import issue_auto_label
 from issue_body_format import issue_body_format
 from issue_close_with_report import close_issue_with_report
 from issue_title_format import issue_title_format
+from issue_triage import issue_triage
+from repo_setting_refresh import repo_setting_refresh
 from settings.server import ServerSetting
 
 load_dotenv()
 
 
+STORAGE_RETRY_MAX_DELAY = 60
+"""Upper bound of the backoff between storage preparation attempts, in seconds"""
+
+
+async def prepare_storage():
+    """
+    Connect the operation store and create the MongoDB indexes.
+    Retried with exponential backoff until it succeeds, dedup and upserts rely on the unique indexes.
+    """
+    store = get_operation_store()
+    delay = 1
+    while True:
+        try:
+            if await store.prepare():
+                if store.name == "mongo":
+                    await ensure_delivery_indexes(webhook_handler.deduplicator.window_seconds)
+                    await ensure_shared_cache_indexes()
+                if ServerSetting.github_backend == "pygithub" and ServerSetting.github_http_cache == "mongo":
+                    await ensure_http_cache_indexes()
+                return
+        except Exception as e:
+            logger.error(f"Failed to prepare {store.name} storage: {e}")
+        logger.warning(f"{store.name} storage is not ready, retrying in {delay}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, STORAGE_RETRY_MAX_DELAY)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 应用启动前的初始化操作
-    pass
+    # A missing or unreadable key would fail every event, refuse to start instead
+    ServerSetting.load_private_key()
+    # Storage is checked in the background, GET /status/ready reports when it is reachable
+    storage_init = asyncio.create_task(prepare_storage())
+    if ServerSetting.github_backend == "pygithub":
+        install_github_http_cache()
+    if OperationSetting.operation_write_behind:
+        await operation_writer.start()
+    await webhook_handler.start_workers()
+    cache_report = None
+    if ServerSetting.cache_report_interval > 0:
+        cache_report = asyncio.create_task(cache_registry.report_periodically(ServerSetting.cache_report_interval))
     yield
+    storage_init.cancel()
+    if cache_report is not None:
+        cache_report.cancel()
+    await webhook_handler.stop_workers()
+    await operation_writer.stop()
+    await get_operation_store().close()
+    await close_rest_client()
     print("Application Shutdown")
 
 
@@ -31,24 +85,43 @@ if __name__ == "__main__":
         Issue,
         action=Issue.CLOSED,
         unique_id="close_issue_with_report",
-        handler=close_issue_with_report
+        handler=close_issue_with_report,
+        feature_flag="issue_close_with_report"
     )
     webhook_handler.register_listener(
         Issue,
         action=Issue.OPENED,
         unique_id="issue_auto_label",
-        handler=issue_auto_label
+        handler=issue_auto_label,
+        feature_flag="issue_auto_label"
     )
     webhook_handler.register_listener(
         Issue,
         action=Issue.OPENED,
         unique_id="issue_title_format",
-        handler=issue_title_format
+        handler=issue_title_format,
+        feature_flag="issue_title_format"
     )
     webhook_handler.register_listener(
         Issue,
         action=Issue.OPENED,
         unique_id="issue_body_format",
-        handler=issue_body_format
+        handler=issue_body_format,
+        feature_flag="issue_body_format"
+    )
+    webhook_handler.register_listener(
+        Issue,
+        action=Issue.OPENED,
+        unique_id="issue_triage",
+        handler=issue_triage,
+        feature_flag="issue_triage"
+    )
+    webhook_handler.register_listener(
+        Push,
+        action=Push.PUSH,
+        unique_id="repo_setting_refresh",
+        handler=repo_setting_refresh,
+        # Setting files pushed by bots must refresh the cache too
+        config=HandlerConfig(escape_bot=False),
     )
     webhook_handler.run(ServerSetting.host, ServerSetting.port)
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Compare JSON backends on webhook payloads.
+
+    python -m playground.bench_json
+
+The payloads in `playground/payloads` carry every field of real `issues.opened` and
+`pull_request.opened` deliveries, with identifiers and text sanitised. They are re-serialized
+compactly, as GitHub sends them, and validated against the event models so they stay
+representative of what production parses.
+"""
+import json
+import pathlib
+import timeit
+
+from core import jsonlib
+from core.webhook.event_type import Issue, PullRequest
+
+PAYLOADS = pathlib.Path(__file__).parent / "payloads"
+MODELS = {"issues.opened": Issue.OPENED_EVENT, "pull_request.opened": PullRequest.OPENED_EVENT}
+
+
+def load_payload(name: str) -> bytes:
+    """
+    :param name: Event and action, e.g. issues.opened
+    :return: Raw body of the delivery
+    """
+    payload = json.loads((PAYLOADS / f"{name}.json").read_text(encoding="utf-8"))
+    MODELS[name].model_validate(payload)
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def _best(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def main(number: int = 1000):
+    print(f"Default backend: {jsonlib.BACKEND}")
+    for name in MODELS:
+        raw = load_payload(name)
+        print(f"\n{name} ({len(raw) / 1024:.1f} KiB)")
+        baseline = _best(lambda: json.loads(raw.decode("utf-8")), number)
+        print(f"  {'json (decode + loads)':<24}{baseline * 1e6:>9.1f} us")
+        for backend in jsonlib.BACKENDS:
+            loads = jsonlib.get_backend(backend)
+            elapsed = _best(lambda: loads(raw), number)
+            print(f"  {backend:<24}{elapsed * 1e6:>9.1f} us  x{baseline / elapsed:.2f}")
+
+
+if __name__ == "__main__":
+    main()
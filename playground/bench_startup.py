@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Import-time profile and cold start of `main.py`.
+
+    python -m playground.bench_startup [--runs 7] [--top 20]
+
+Each run is a fresh interpreter importing `main`, so nothing is shared between runs.
+Connections (MongoDB, GitHub), the private key and Pillow must not load at import:
+a regression shows up in the profile as one of them among the slowest modules.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+COLD_START_TARGET_MS = 1500
+"""Median wall time of `python -c "import main"`, measured at 1050-1400 ms on a dev machine when this target was set"""
+DEFERRED_MODULES = ("PIL", "uvicorn")
+"""Modules that must only be imported on first use"""
+
+# Settings without defaults, the values are never used during import
+STUB_ENV = {
+    "GITHUB_APP_ID": "1",
+    "TOKEN_SECRET": "startup-bench",
+    "DASHBOARD_API_URL": "http://127.0.0.1",
+}
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    for key, value in STUB_ENV.items():
+        env.setdefault(key, value)
+    return env
+
+
+def import_profile() -> Dict[str, Tuple[int, int]]:
+    """
+    Run `python -X importtime -c "import main"`.
+    :return: module -> (self us, cumulative us)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        capture_output=True, text=True, env=_env(), check=True,
+    )
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, module = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not self_us.isdigit():
+            continue
+        profile[module.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+
+def cold_start(runs: int) -> List[float]:
+    """Wall time of `import main` in a fresh interpreter, in milliseconds."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import main"], capture_output=True, env=_env(), check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    profile = import_profile()
+    top_level = {module: times for module, times in profile.items() if "." not in module}
+    print(f"Slowest top-level packages (cumulative), {len(profile)} modules imported")
+    for module, (self_us, cumulative_us) in sorted(top_level.items(), key=lambda x: -x[1][1])[:args.top]:
+        print(f"{cumulative_us / 1000:>10.1f} ms  {self_us / 1000:>8.1f} ms self  {module}")
+
+    deferred = [module for module in DEFERRED_MODULES if module in profile]
+    if deferred:
+        print(f"\nImported eagerly but should be deferred: {', '.join(deferred)}")
+
+    timings = cold_start(args.runs)
+    median = statistics.median(timings)
+    print(
+        f"\nCold start over {args.runs} runs: median {median:.0f} ms, "
+        f"min {min(timings):.0f} ms, max {max(timings):.0f} ms, target {COLD_START_TARGET_MS} ms"
+    )
+    if median > COLD_START_TARGET_MS or deferred:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
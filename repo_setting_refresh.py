@@ -0,0 +1,13 @@
+from loguru import logger
+
+from core.utils import REPO_SETTING_FILE, setting_cache
+from core.webhook.event_type import Push
+
+
+# @webhook_handler.listen(Push, action=Push.PUSH, unique_id="repo_setting_refresh")
+async def repo_setting_refresh(event: Push.PUSH_EVENT):
+    """Drop the cached repository setting when the config file changed on the default branch."""
+    if not event.on_default_branch or not event.may_change(REPO_SETTING_FILE):
+        return
+    await setting_cache.invalidate_shared(event.repository.full_name)
+    logger.info(f"{REPO_SETTING_FILE} of {event.repository.full_name} changed in {event.after[:7]}, cache invalidated")
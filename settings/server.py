@@ -1,7 +1,8 @@
 import pathlib
+from typing import Literal
 
 from dotenv import load_dotenv
-from pydantic import Field, model_validator, SecretStr
+from pydantic import Field, SecretStr
 from pydantic_settings import BaseSettings
 
 
@@ -13,17 +14,40 @@ class Server(BaseSettings):
     github_private_key: SecretStr = SecretStr('')
     token_secret: str = Field(None, validation_alias="TOKEN_SECRET")
     dashboard_api_url: str = Field(None, validation_alias="DASHBOARD_API_URL")
+    webhook_background: bool = Field(False, validation_alias="WEBHOOK_BACKGROUND")
+    """Acknowledge deliveries with 202 and process them in a worker pool"""
+    webhook_workers: int = Field(4, validation_alias="WEBHOOK_WORKERS")
+    webhook_queue_size: int = Field(1000, validation_alias="WEBHOOK_QUEUE_SIZE")
+    github_backend: Literal["rest", "pygithub"] = Field("rest", validation_alias="GITHUB_BACKEND")
+    """Backend of the GitHub client used by handlers, native aiohttp or PyGithub in a thread pool"""
+    github_http_cache: Literal["memory", "filesystem", "mongo", "off"] = Field(
+        "memory", validation_alias="GITHUB_HTTP_CACHE"
+    )
+    """Where PyGithub responses are kept for ETag revalidation"""
+    github_http_cache_path: str = Field("~/.cache/contributor/github_http", validation_alias="GITHUB_HTTP_CACHE_PATH")
+    github_http_cache_size: int = Field(64 * 1024 * 1024, validation_alias="GITHUB_HTTP_CACHE_SIZE")
+    """Bytes kept by the GitHub HTTP cache"""
+    shared_cache: bool = Field(True, validation_alias="SHARED_CACHE")
+    """Share cached repository settings between workers through MongoDB"""
+    setting_push_invalidation: bool = Field(False, validation_alias="SETTING_PUSH_INVALIDATION")
+    """The GitHub App receives push events, so the shared cache may keep settings until they change"""
+    issue_write_deadline: float = Field(10, validation_alias="ISSUE_WRITE_DEADLINE")
+    """Seconds queued issue edits of a delivery may wait before they are flushed"""
+    cache_report_interval: float = Field(600, validation_alias="CACHE_REPORT_INTERVAL")
+    """Seconds between cache statistics in the log, 0 to disable"""
 
-    @model_validator(mode="after")
-    def validator(self):
-        if not pathlib.Path(self.github_private_key_file).exists():
-            raise FileNotFoundError(f"Github private key file not exists: {self.github_private_key_file}")
-        else:
-            with pathlib.Path(self.github_private_key_file).open("r") as file:
-                _key = file.read()
-                _key = _key.strip()
-                self.github_private_key = SecretStr(_key)
-        return self
+    def load_private_key(self) -> str:
+        """
+        Read the GitHub App private key file on first use, not at import.
+        :raises FileNotFoundError: The key file does not exist
+        """
+        if not self.github_private_key.get_secret_value():
+            key_file = pathlib.Path(self.github_private_key_file).expanduser()
+            if not key_file.exists():
+                raise FileNotFoundError(f"Github private key file not exists: {self.github_private_key_file}")
+            with key_file.open("r") as file:
+                self.github_private_key = SecretStr(file.read().strip())
+        return self.github_private_key.get_secret_value()
 
 
 load_dotenv()
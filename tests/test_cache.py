@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+from datetime import timedelta
+
+import pytest
+
+from pymongo.errors import DuplicateKeyError
+
+from core.cache import AsyncCache, FrequencySketch, cached
+from core.mongo import MongoSharedCache, utcnow
+
+
+class FakeCollection:
+    """Motor collection with the upsert and TTL index behaviour `MongoSharedCache` relies on."""
+
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one(self, query):
+        doc = self.docs.get(query["_id"])
+        return dict(doc) if doc is not None else None
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None, projection=None):
+        doc = self.docs.get(query["_id"])
+        if doc is not None and any(doc.get(field) != value for field, value in query.items()):
+            if upsert:
+                raise DuplicateKeyError("E11000 duplicate key error")
+            return None
+        if doc is None:
+            if not upsert:
+                return None
+            doc = self.docs[query["_id"]] = dict(query)
+        doc.update(update.get("$set", {}))
+        for field in update.get("$unset", {}):
+            doc.pop(field, None)
+        for field, step in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + step
+        return {"_id": doc["_id"], "version": doc["version"]}
+
+    def run_ttl_monitor(self, now):
+        """Delete what the TTL index on `purge_at` would delete at `now`."""
+        self.docs = {key: doc for key, doc in self.docs.items() if doc["purge_at"] > now}
+
+
+class FakeMongoSharedCache(MongoSharedCache):
+    def __init__(self):
+        self.fake_collection = FakeCollection()
+
+    @property
+    def collection(self):
+        return self.fake_collection
+
+
+def test_sketch_counts_and_saturates():
+    sketch = FrequencySketch(width=64, sample_size=10_000)
+    for _ in range(3):
+        sketch.increment("a")
+    assert sketch.frequency("a") >= 3
+    assert sketch.frequency("never") <= sketch.frequency("a")
+    for _ in range(100):
+        sketch.increment("b")
+    assert sketch.frequency("b") == FrequencySketch.MAX_COUNT
+
+
+def test_sketch_ages():
+    sketch = FrequencySketch(width=64, sample_size=20)
+    for _ in range(8):
+        sketch.increment("a")
+    before = sketch.frequency("a")
+    for i in range(12):
+        sketch.increment(("other", i))
+    assert sketch.frequency("a") < before
+
+
+def test_byte_accounting():
+    cache = AsyncCache(ttl=60, max_len=100, max_bytes=10, sizeof=len)
+    assert cache.set("a", "xxxx")
+    assert cache.set("b", "yyyy")
+    assert cache.bytes == 8
+    assert cache.set("a", "zz")
+    assert cache.bytes == 6
+    assert cache.set("c", "wwww")
+    assert cache.bytes == 10 and len(cache) == 3
+    assert cache.set("d", "vvv")
+    # "b" is the least recently used entry, it makes room for "d"
+    assert "b" not in cache and cache.bytes == 9
+    assert cache.evictions["size"] == 1
+    cache.invalidate("a")
+    assert cache.bytes == 7 and cache.evictions["invalidation"] == 1
+    assert not cache.set("huge", "x" * 11)
+    assert cache.bytes == 7
+
+
+def test_admission_keeps_hot_keys_against_a_scan():
+    sketch = FrequencySketch(width=1024)
+    cache = AsyncCache(ttl=60, max_len=50, admission=sketch)
+    hot = [f"hot-{i}" for i in range(50)]
+    for _ in range(5):
+        for key in hot:
+            sketch.increment(key)
+    for key in hot:
+        cache.set(key, key)
+    for i in range(1000):
+        key = f"scan-{i}"
+        sketch.increment(key)
+        cache.set(key, key)
+    kept = sum(key in cache for key in hot)
+    assert kept >= 45
+    assert cache.rejections > 0
+
+
+def test_rejected_value_evicts_nothing():
+    sketch = FrequencySketch(width=1024)
+    cache = AsyncCache(ttl=60, max_len=100, max_bytes=10, sizeof=len, admission=sketch)
+    cache.set("cold", "aaaa")
+    cache.set("hot", "bbbb")
+    for _ in range(5):
+        sketch.increment("hot")
+    sketch.increment("big")
+    sketch.increment("big")
+    # "big" needs both entries gone, it beats "cold" but not "hot"
+    assert not cache.set("big", "cccccccc")
+    assert "cold" in cache and "hot" in cache
+    assert cache.bytes == 8
+    assert cache.evictions["size"] == 0
+
+
+def test_expired_victims_do_not_block_admission():
+    sketch = FrequencySketch(width=1024)
+    cache = AsyncCache(ttl=0.01, jitter=0, max_len=1, admission=sketch)
+    for _ in range(5):
+        sketch.increment("old")
+    cache.set("old", 1)
+    time.sleep(0.02)
+    assert cache.set("new", 2)
+    assert cache.evictions["ttl"] == 1
+
+
+def test_single_flight():
+    async def run():
+        cache = AsyncCache(ttl=60)
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "value"
+
+        results = await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(10)))
+        assert results == ["value"] * 10
+        assert calls == 1
+        assert cache.coalesced == 9
+
+    asyncio.run(run())
+
+
+def test_invalidation_during_load_is_not_overwritten():
+    async def run():
+        cache = AsyncCache(ttl=60)
+        loading = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow():
+            loading.set()
+            await release.wait()
+            return "old"
+
+        async def fresh():
+            return "new"
+
+        load = asyncio.ensure_future(cache.get_or_load("k", slow))
+        await loading.wait()
+        cache.invalidate("k")
+        # Joining the invalidated load would wait for `release` forever
+        assert await asyncio.wait_for(cache.get_or_load("k", fresh), 1) == "new"
+        release.set()
+        assert await load == "old"
+        await asyncio.sleep(0)
+        assert await cache.get_or_load("k", fresh) == "new"
+        assert cache.data["k"].value == "new"
+
+    asyncio.run(run())
+
+
+def test_stale_value_is_served_while_refreshing():
+    async def run():
+        cache = AsyncCache(ttl=0.01, stale_ttl=60, jitter=0)
+        version = 0
+
+        async def loader():
+            nonlocal version
+            version += 1
+            return version
+
+        assert await cache.get_or_load("k", loader) == 1
+        await asyncio.sleep(0.02)
+        assert await cache.get_or_load("k", loader) == 1
+        assert cache.stale_hits == 1
+        await asyncio.sleep(0.005)
+        assert await cache.get_or_load("k", loader) == 2
+
+    asyncio.run(run())
+
+
+def test_failed_refresh_keeps_stale_value_and_errors_are_not_cached():
+    async def run():
+        cache = AsyncCache(ttl=0.01, stale_ttl=60, jitter=0)
+
+        async def failing():
+            raise RuntimeError("down")
+
+        async def ok():
+            return "v"
+
+        with pytest.raises(RuntimeError):
+            await cache.get_or_load("k", failing)
+        assert "k" not in cache
+        assert await cache.get_or_load("k", ok) == "v"
+        await asyncio.sleep(0.02)
+        assert await cache.get_or_load("k", failing) == "v"
+        await asyncio.sleep(0.005)
+        assert cache.load_errors == 2
+        assert await cache.get_or_load("k", failing) == "v"
+
+    asyncio.run(run())
+
+
+def test_negative_results_use_their_own_ttl():
+    async def run():
+        cache = AsyncCache(ttl=60, negative_ttl=0.01, jitter=0)
+        calls = 0
+
+        async def missing():
+            nonlocal calls
+            calls += 1
+            return None
+
+        assert await cache.get_or_load("k", missing) is None
+        assert await cache.get_or_load("k", missing) is None
+        assert calls == 1
+        await asyncio.sleep(0.02)
+        await cache.get_or_load("k", missing)
+        assert calls == 2
+
+    asyncio.run(run())
+
+
+def test_cached_decorator_keys_calls():
+    async def run():
+        calls = []
+
+        @cached(AsyncCache(ttl=60), key=lambda owner, repo: f"{owner}/{repo}")
+        async def fetch(owner, repo):
+            calls.append((owner, repo))
+            return f"{owner}/{repo}"
+
+        assert await fetch("a", "b") == "a/b"
+        assert await fetch("a", "b") == "a/b"
+        assert await fetch("a", "c") == "a/c"
+        assert calls == [("a", "b"), ("a", "c")]
+        fetch.cache.invalidate("a/b")
+        await fetch("a", "b")
+        assert len(calls) == 3
+
+    asyncio.run(run())
+
+
+def test_l2_shares_loaded_values():
+    async def run():
+        l2 = FakeMongoSharedCache()
+        first = AsyncCache(ttl=60, namespace="test", l2=l2)
+        second = AsyncCache(ttl=60, namespace="test", l2=l2)
+
+        async def loader():
+            return "v"
+
+        async def unused():
+            raise AssertionError("the L2 value should be used")
+
+        assert await first.get_or_load("k", loader) == "v"
+        assert await second.get_or_load("k", unused) == "v"
+        assert second.l2_hits == 1
+        assert second.data["k"].version == 1
+
+    asyncio.run(run())
+
+
+async def load_during_invalidation(l2, before_release=lambda: None):
+    """Load "k" with a loader that finishes only after another worker invalidated the key."""
+    cache = AsyncCache(ttl=60, namespace="test", l2=l2)
+    other = AsyncCache(ttl=60, namespace="test", l2=l2)
+    loading = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow():
+        loading.set()
+        await release.wait()
+        return "old"
+
+    load = asyncio.ensure_future(cache.get_or_load("k", slow))
+    await loading.wait()
+    await other.invalidate_shared("k")
+    before_release()
+    release.set()
+    assert await load == "old"
+    await asyncio.sleep(0)
+    return cache
+
+
+def test_l2_write_is_skipped_when_an_unknown_key_is_invalidated_during_load():
+    async def run():
+        l2 = FakeMongoSharedCache()
+        cache = await load_during_invalidation(l2)
+        assert "k" not in cache
+        assert cache.l2_conflicts == 1
+        entry = await l2.get("test", "k")
+        assert entry.version == 1 and not entry.live
+
+        async def fresh():
+            return "new"
+
+        assert await cache.get_or_load("k", fresh) == "new"
+        entry = await l2.get("test", "k")
+        assert (entry.value, entry.version, entry.live) == ("new", 2, True)
+
+    asyncio.run(run())
+
+
+def test_l2_tombstone_outlives_the_ttl_monitor():
+    async def run():
+        l2 = FakeMongoSharedCache()
+
+        async def loader():
+            return "v"
+
+        await AsyncCache(ttl=60, namespace="test", l2=l2).get_or_load("k", loader)
+        await AsyncCache(ttl=60, namespace="test", l2=l2).invalidate_shared("k")
+        # The load sees the expired tombstone, a second push lands while it runs
+        cache = await load_during_invalidation(
+            l2, before_release=lambda: l2.fake_collection.run_ttl_monitor(utcnow() + timedelta(minutes=2))
+        )
+        assert "k" not in cache
+        assert cache.l2_conflicts == 1
+        entry = await l2.get("test", "k")
+        assert entry.version == 3 and not entry.live
+        l2.fake_collection.run_ttl_monitor(utcnow() + timedelta(seconds=l2.tombstone_ttl + 1))
+        assert await l2.get("test", "k") is None
+
+    asyncio.run(run())